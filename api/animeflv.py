@@ -1,14 +1,22 @@
 import cloudscraper
-import json, re
+import json, re, sys
 
-from typing import Dict, List, Optional, Tuple, Type, Union
+from array import array
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Type, TypeVar, Union
 from types import TracebackType
 from bs4 import BeautifulSoup, Tag, ResultSet
 from urllib.parse import unquote, urlencode
 from enum import Flag, auto
+from .cache import ResponseCache
 from .exception import AnimeFLVParseError
+from .singleflight import SingleFlight
 from dataclasses import dataclass
 
+T = TypeVar("T")
+
+# ouo.io redirect wrapping the download links
+OUO_PREFIX = re.compile(r"^http[s]?://ouo.io/[A-Za-z0-9]+/[A-Za-z0-9]+\?[A-Za-z0-9]+=")
+
 
 def removeprefix(str: str, prefix: str) -> str:
     """
@@ -48,16 +56,78 @@ ANIME_VIDEO_URL = "https://animeflv.net/ver/"
 ANIME_URL = "https://animeflv.net/anime/"
 BASE_EPISODE_IMG_URL = "https://cdn.animeflv.net/screenshots/"
 
+# Seconds a response is cached for, the longest matching url prefix wins. The homepage
+# changes with every release while episode pages are almost never edited.
+DEFAULT_CACHE_TTLS = (
+    (BASE_URL, 60),
+    (BROWSE_URL, 10 * 60),
+    (ANIME_URL, 60 * 60),
+    (ANIME_VIDEO_URL, 24 * 60 * 60),
+)
 
-@dataclass
+
+@dataclass(frozen=True, slots=True)
 class EpisodeInfo:
     id: Union[str, int]
     anime: str
     image_preview: Optional[str] = None
 
 
+class EpisodeList(Sequence):
+    """
+    Episodes of an anime stored as the anime id, its thumbnails id and an array of episode
+    numbers. Behaves like a list of `EpisodeInfo`, built on access with the preview url
+    computed from the numbers, so a long series costs a few bytes per episode instead of an
+    object and a url string each.
+
+    :param anime: Anime id, like as 'nanatsu-no-taizai'.
+    :param thumbnails: Id of the anime in the thumbnails urls.
+    :param numbers: Episode numbers, in order.
+    """
+
+    __slots__ = ("anime", "thumbnails", "numbers")
+
+    def __init__(self, anime: str, thumbnails: Union[str, int], numbers: Iterable[Union[str, int]]):
+        numbers = list(numbers)
+        self.anime = anime
+        self.thumbnails = thumbnails
+        # Episode numbers are ints in practice, anything else is kept as is
+        self.numbers = (
+            array("l", numbers) if all(type(n) is int for n in numbers) else tuple(numbers)
+        )
+
+    def __len__(self) -> int:
+        return len(self.numbers)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return EpisodeList(self.anime, self.thumbnails, self.numbers[index])
+        return self._episode(self.numbers[index])
+
+    def __iter__(self) -> Iterator[EpisodeInfo]:
+        return map(self._episode, self.numbers)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, EpisodeList):
+            return (self.anime, self.thumbnails, list(self.numbers)) == (
+                other.anime, other.thumbnails, list(other.numbers)
+            )
+        if isinstance(other, Sequence):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"EpisodeList(anime={self.anime!r}, thumbnails={self.thumbnails!r}, numbers={list(self.numbers)!r})"
+
+    def _episode(self, number: Union[str, int]) -> EpisodeInfo:
+        return EpisodeInfo(
+            id=number,
+            anime=self.anime,
+            image_preview=f"{BASE_EPISODE_IMG_URL}{self.thumbnails}/{number}/th_3.jpg",
+        )
+
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class AnimeInfo:
     id: Union[str, int]
     title: str
@@ -68,30 +138,492 @@ class AnimeInfo:
     genres: Optional[List[str]] = None
     debut: Optional[str] = None
     type: Optional[str] = None
-    episodes: Optional[List[EpisodeInfo]] = None
+    episodes: Optional[Sequence[EpisodeInfo]] = None
 
+    def __post_init__(self):
+        # bs4 strings keep their whole parsed page alive, store plain copies
+        for field in ("title", "poster", "banner", "synopsis", "rating", "debut", "type"):
+            value = getattr(self, field)
+            if isinstance(value, str) and type(value) is not str:
+                object.__setattr__(self, field, str(value))
 
-@dataclass
+
+@dataclass(frozen=True, slots=True)
 class DownloadLinkInfo:
     server: str
     url: str
 
+    def __post_init__(self):
+        # A handful of server names repeated in every episode, share a single string each
+        if isinstance(self.server, str):
+            object.__setattr__(self, "server", sys.intern(str(self.server)))
+
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class EpisodeInfoDownload:
     id: Union[str, int]
     anime: str
     image_preview: Optional[str] = None
     downloads: Optional[List[DownloadLinkInfo]] = None
+    error: Optional[str] = None
+
+
+@dataclass(frozen=True, slots=True)
+class SearchPage:
+    animes: List[AnimeInfo]
+    page: int
+    page_count: int
+
 
 class EpisodeFormat(Flag):
     Subtitled = auto()
     Dubbed = auto()
 
 
+# Labels of the formats in the episode pages
+EPISODE_FORMATS = {"SUB": EpisodeFormat.Subtitled, "LAT": EpisodeFormat.Dubbed}
+
+
+@dataclass(frozen=True, slots=True)
+class EpisodePage:
+    """
+    Everything an episode page offers in every format, in page order: the download links
+    and the in video servers, each with the format it belongs to.
+    """
+
+    links: List[Tuple[EpisodeFormat, DownloadLinkInfo]]
+    video_servers: List[Tuple[EpisodeFormat, Dict[str, str]]]
+
+    def get_links(self, format: EpisodeFormat = EpisodeFormat.Subtitled) -> List[DownloadLinkInfo]:
+        """
+        Download links of the given formats.
+
+        :param format: Formats to keep.
+        :rtype: list[DownloadLinkInfo]
+        """
+        return [link for link_format, link in self.links if link_format in format]
+
+    def get_video_servers(self, format: EpisodeFormat = EpisodeFormat.Subtitled) -> List[Dict[str, str]]:
+        """
+        In video servers of the given formats.
+
+        :param format: Formats to keep.
+        :rtype: list
+        """
+        return [servers for server_format, servers in self.video_servers if server_format in format]
+
+
+def browse_url(query: str = None, page: int = None) -> str:
+    """
+    Build the url of a search in animeflv.net.
+
+    :param query: Query information like: 'Nanatsu no Taizai'.
+    :param page: Page of the information return.
+    :rtype: str
+    """
+
+    if page is not None and not isinstance(page, int):
+        raise TypeError
+
+    params = dict()
+    if query is not None:
+        params["q"] = query
+    if page is not None:
+        params["page"] = page
+    params = urlencode(params)
+
+    url = f"{BROWSE_URL}"
+    if params != "":
+        url += f"?{params}"
+
+    return url
+
+
+def anime_url(id: str) -> str:
+    """
+    Build the url of an anime page, the one cached by `AnimeFLV.get_anime_info`.
+
+    :param id: Anime id, like as 'nanatsu-no-taizai'.
+    :rtype: str
+    """
+
+    return f"{ANIME_URL}/{id}"
+
+
+def merge_search_pages(pages: Iterable[SearchPage]) -> List[AnimeInfo]:
+    """
+    Join the animes of several result pages in page order, keeping the first appearance of
+    every id (a listing shifting while it's read can repeat an anime in the next page).
+
+    :param pages: result pages, in any order.
+    :rtype: list[AnimeInfo]
+    """
+
+    seen = set()
+    ret = []
+    for page in sorted(pages, key=lambda page: page.page):
+        for anime in page.animes:
+            if str(anime.id) not in seen:
+                seen.add(str(anime.id))
+                ret.append(anime)
+
+    return ret
+
+
+def parse_links(html: str, format: EpisodeFormat = EpisodeFormat.Subtitled) -> List[DownloadLinkInfo]:
+    """
+    Parse the download links table of an episode page.
+
+    :param html: Episode page, like as '/ver/nanatsu-no-taizai-1'.
+    :param format: Formats to keep.
+    :rtype: list[DownloadLinkInfo]
+    """
+    soup = BeautifulSoup(html, "lxml")
+    return [link for link_format, link in _episode_links(soup) if link_format in format]
+
+
+def parse_episode_page(html: str) -> EpisodePage:
+    """
+    Parse the download links and the in video servers of an episode page at once.
+
+    :param html: Episode page, like as '/ver/nanatsu-no-taizai-1'.
+    :rtype: EpisodePage
+    """
+    soup = BeautifulSoup(html, "lxml")
+    return EpisodePage(links=_episode_links(soup), video_servers=_episode_video_servers(soup))
+
+
+def _episode_links(soup: BeautifulSoup) -> List[Tuple[EpisodeFormat, DownloadLinkInfo]]:
+    table = soup.find("table", attrs={"class": "RTbl"})
+
+    try:
+        rows = parse_table(table)
+        ret = []
+
+        for row in rows:
+            link_format = EPISODE_FORMATS.get(row["FORMATO"].string)
+            if link_format is not None:
+                ret.append(
+                    (
+                        link_format,
+                        DownloadLinkInfo(
+                            server=row["SERVIDOR"].string,
+                            url=OUO_PREFIX.sub("", unquote(row["DESCARGAR"].a["href"])),
+                        ),
+                    )
+                )
+
+        return ret
+    except Exception as exc:
+        raise AnimeFLVParseError(exc)
+
+
+def _episode_video_servers(soup: BeautifulSoup) -> List[Tuple[EpisodeFormat, Dict[str, str]]]:
+    servers = []
+
+    for script in soup.find_all("script"):
+        content = str(script)
+        if "var videos = {" in content:
+            videos = content.split("var videos = ")[1].split(";")[0]
+            data = json.loads(videos)
+
+            for label, server_format in EPISODE_FORMATS.items():
+                if label in data:
+                    servers.append((server_format, data[label]))
+
+    return servers
+
+
+def parse_search(html: str) -> List[AnimeInfo]:
+    """
+    Parse the list of animes of a browse page.
+
+    :param html: Browse page, like as '/browse?q=nanatsu'.
+    :rtype: list[AnimeInfo]
+    """
+    return _search(BeautifulSoup(html, "lxml"))
+
+
+def parse_page_count(html: str) -> int:
+    """
+    Parse the amount of result pages of a browse page, 1 when it has no pagination.
+
+    :param html: Browse page, like as '/browse?q=nanatsu'.
+    :rtype: int
+    """
+    return _page_count(BeautifulSoup(html, "lxml"))
+
+
+def parse_browse_page(html: str) -> Tuple[List[AnimeInfo], int]:
+    """
+    Parse the list of animes and the amount of result pages of a browse page at once.
+
+    :param html: Browse page, like as '/browse?q=nanatsu'.
+    :rtype: tuple[list[AnimeInfo], int]
+    """
+    soup = BeautifulSoup(html, "lxml")
+    return _search(soup), _page_count(soup)
+
+
+def _search(soup: BeautifulSoup) -> List[AnimeInfo]:
+    elements = soup.select("div.Container ul.ListAnimes li article")
+
+    if elements is None:
+        raise AnimeFLVParseError("Unable to get list of animes")
+
+    return process_anime_list_info(elements)
+
+
+def _page_count(soup: BeautifulSoup) -> int:
+    pages = [int(a.string) for a in soup.select("ul.pagination li a") if (a.string or "").isdigit()]
+
+    return max(pages, default=1)
+
+
+def parse_video_servers(html: str, format: EpisodeFormat = EpisodeFormat.Subtitled) -> List[Dict[str, str]]:
+    """
+    Parse the in video servers of an episode page.
+
+    :param html: Episode page, like as '/ver/nanatsu-no-taizai-1'.
+    :param format: Formats to keep.
+    :rtype: list
+    """
+    soup = BeautifulSoup(html, "lxml")
+    return [servers for server_format, servers in _episode_video_servers(soup) if server_format in format]
+
+
+def parse_latest_episodes(html: str) -> List[EpisodeInfo]:
+    """
+    Parse the new episodes released of the homepage.
+
+    :param html: Homepage.
+    :rtype: list[EpisodeInfo]
+    """
+    soup = BeautifulSoup(html, "lxml")
+
+    elements = soup.select("ul.ListEpisodios li a")
+    ret = []
+
+    for element in elements:
+        try:
+            anime, _, id = element["href"].rpartition("-")
+
+            ret.append(
+                EpisodeInfo(
+                    id=id,
+                    anime=removeprefix(anime, "/ver/"),
+                    image_preview=f"{BASE_URL}{element.select_one('span.Image img').get('src')}",
+                )
+            )
+        except Exception as exc:
+            raise AnimeFLVParseError(exc)
+
+    return ret
+
+
+def parse_latest_animes(html: str) -> List[AnimeInfo]:
+    """
+    Parse the new animes released of the homepage.
+
+    :param html: Homepage.
+    :rtype: list[AnimeInfo]
+    """
+    soup = BeautifulSoup(html, "lxml")
+
+    elements = soup.select("ul.ListAnimes li article")
+
+    if elements is None:
+        raise AnimeFLVParseError("Unable to get list of animes")
+
+    return process_anime_list_info(elements)
+
+
+def parse_anime_info(html: str, id: str) -> AnimeInfo:
+    """
+    Parse the information of an anime page.
+
+    :param html: Anime page, like as '/anime/nanatsu-no-taizai'.
+    :param id: Anime id, like as 'nanatsu-no-taizai'.
+    :rtype: AnimeInfo
+    """
+    soup = BeautifulSoup(html, "lxml")
+
+    synopsis = soup.select_one(
+        "body div div div div div main section div.Description p"
+    ).string
+
+    information = {
+        "title": soup.select_one(
+            "body div.Wrapper div.Body div div.Ficha.fchlt div.Container h1.Title"
+        ).string,
+        "poster": BASE_URL
+        + "/"
+        + soup.select_one(
+            "body div div div div div aside div.AnimeCover div.Image figure img"
+        ).get("src", ""),
+        "synopsis": synopsis.strip() if synopsis else None,
+        "rating": soup.select_one(
+            "body div div div.Ficha.fchlt div.Container div.vtshr div.Votes span#votes_prmd"
+        ).string,
+        "debut": soup.select_one(
+            "body div.Wrapper div.Body div div.Container div.BX.Row.BFluid.Sp20 aside.SidebarA.BFixed p.AnmStts"
+        ).string,
+        "type": soup.select_one(
+            "body div.Wrapper div.Body div div.Ficha.fchlt div.Container span.Type"
+        ).string,
+    }
+    information["banner"] = (
+        information["poster"].replace("covers", "banners").strip()
+    )
+    genres = []
+
+    for element in soup.select("main.Main section.WdgtCn nav.Nvgnrs a"):
+        if "=" in element["href"]:
+            genres.append(element["href"].split("=")[1])
+
+    info_ids = []
+    episodes_data = []
+    episodes = []
+
+    try:
+        for script in soup.find_all("script"):
+            contents = str(script)
+
+            if "var anime_info = [" in contents:
+                anime_info = contents.split("var anime_info = ")[1].split(";")[0]
+                info_ids.append(json.loads(anime_info))
+
+            if "var episodes = [" in contents:
+                data = contents.split("var episodes = ")[1].split(";")[0]
+                episodes_data.extend(json.loads(data))
+
+        AnimeThumbnailsId = info_ids[0][0]
+        animeId = info_ids[0][2]
+        # nextEpisodeDate = info_ids[0][3] if len(info_ids[0]) > 4 else None
+
+        episodes = EpisodeList(id, AnimeThumbnailsId, [episode for episode, _ in episodes_data])
+
+    except Exception as exc:
+        raise AnimeFLVParseError(exc)
+
+    return AnimeInfo(
+        id=id,
+        episodes=episodes,
+        genres=genres,
+        **information,
+    )
+
+
+def process_anime_list_info(elements: ResultSet) -> List[AnimeInfo]:
+    ret = []
+
+    for element in elements:
+        try:
+            ret.append(
+                AnimeInfo(
+                    id=removeprefix(
+                        element.select_one("div.Description a.Button")["href"][1:],
+                        "anime/",
+                    ),
+                    title=element.select_one("a h3").string,
+                    poster=(
+                        element.select_one("a div.Image figure img").get(
+                            "src", None
+                        )
+                        or element.select_one("a div.Image figure img")["data-cfsrc"]
+                    ),
+                    banner=(
+                        element.select_one("a div.Image figure img").get(
+                            "src", None
+                        )
+                        or element.select_one("a div.Image figure img")["data-cfsrc"]
+                    )
+                    .replace("covers", "banners")
+                    .strip(),
+                    type=element.select_one("div.Description p span.Type").string,
+                    synopsis=(
+                        element.select("div.Description p")[1].string.strip()
+                        if element.select("div.Description p")[1].string
+                        else None
+                    ),
+                    rating=element.select_one("div.Description p span.Vts").string,
+                    debut=(
+                        element.select_one("a span.Estreno").string.lower()
+                        if element.select_one("a span.Estreno")
+                        else None
+                    ),
+                )
+            )
+        except Exception as exc:
+            raise AnimeFLVParseError(exc)
+
+    return ret
+
+
+class SoupParser(object):
+    """
+    Parses pages with BeautifulSoup and CSS selectors.
+    """
+
+    def search(self, html: str) -> List[AnimeInfo]:
+        return parse_search(html)
+
+    def page_count(self, html: str) -> int:
+        return parse_page_count(html)
+
+    def browse_page(self, html: str) -> Tuple[List[AnimeInfo], int]:
+        return parse_browse_page(html)
+
+    def latest_animes(self, html: str) -> List[AnimeInfo]:
+        return parse_latest_animes(html)
+
+    def latest_episodes(self, html: str) -> List[EpisodeInfo]:
+        return parse_latest_episodes(html)
+
+    def anime_info(self, html: str, id: str) -> AnimeInfo:
+        return parse_anime_info(html, id)
+
+    def links(
+        self, html: str, format: EpisodeFormat = EpisodeFormat.Subtitled
+    ) -> List[DownloadLinkInfo]:
+        return parse_links(html, format)
+
+    def video_servers(
+        self, html: str, format: EpisodeFormat = EpisodeFormat.Subtitled
+    ) -> List[Dict[str, str]]:
+        return parse_video_servers(html, format)
+
+    def episode_page(self, html: str) -> EpisodePage:
+        return parse_episode_page(html)
+
+
+def get_parser(parser: Union[str, object] = "bs4"):
+    """
+    Get the parser backend used to turn pages into models.
+
+    :param parser: 'bs4' (BeautifulSoup, the default), 'lxml' (direct lxml and XPath,
+        faster) or an object with the same methods as `SoupParser`.
+    """
+
+    if not isinstance(parser, str):
+        return parser
+    if parser == "bs4":
+        return SoupParser()
+    if parser == "lxml":
+        from .lxml_parser import LxmlParser
+
+        return LxmlParser()
+    raise ValueError(f"Unknown parser: {parser}")
+
+
 class AnimeFLV(object):
     def __init__(self, *args, **kwargs):
         session = kwargs.get("session", None)
+        self._parser = get_parser(kwargs.get("parser", "bs4"))
+        self._cache: Optional[ResponseCache] = kwargs.get("cache", None)
+        self._catalog = kwargs.get("catalog", None)
+        self._timeout: float = kwargs.get("timeout", 30)
+        self._flight: Optional[SingleFlight] = kwargs.get("flight", None)
         self._scraper = cloudscraper.create_scraper(session)
 
     def close(self) -> None:
@@ -130,35 +662,26 @@ class AnimeFLV(object):
         :param **kwargs: Optional arguments for filter output (see doc).
         :rtype: list
         """
-        response = self._scraper.get(f"{ANIME_VIDEO_URL}{id}")
-        soup = BeautifulSoup(response.text, "lxml")
-        table = soup.find("table", attrs={"class": "RTbl"})
+        return self.get_episode_page(id).get_links(format)
 
-        try:
-            rows = parse_table(table)
-            ret = []
-
-            for row in rows:
-                if (
-                    row["FORMATO"].string == "SUB"
-                    and EpisodeFormat.Subtitled in format
-                    or row["FORMATO"].string == "LAT"
-                    and EpisodeFormat.Dubbed in format
-                ):
-                    ret.append(
-                        DownloadLinkInfo(
-                            server=row["SERVIDOR"].string,
-                            url=re.sub(
-                                r"^http[s]?://ouo.io/[A-Za-z0-9]+/[A-Za-z0-9]+\?[A-Za-z0-9]+=",
-                                "",
-                                unquote(row["DESCARGAR"].a["href"]),
-                            ),
-                        )
-                    )
+    def get_episode_page(self, id: str, episode: int = None) -> EpisodePage:
+        """
+        Get the download links and the in video servers of an episode, in every format,
+        with a single request. Use it instead of `get_links` and `get_video_servers`
+        when both are needed.
+
+        :param id: Episode id, like as 'nanatsu-no-taizai-1', or anime id along with
+            `episode`.
+        :param episode: Episode number, like as 1.
+        :rtype: EpisodePage
+        """
+        if episode is not None:
+            id = f"{id}-{episode}"
 
-            return ret
-        except Exception as exc:
-            raise AnimeFLVParseError(exc)
+        return self._once(
+            ("episode_page", id),
+            lambda: self._parser.episode_page(self._get(f"{ANIME_VIDEO_URL}{id}")),
+        )
 
     def list(self, page: int = None) -> List[Dict[str, str]]:
         """
@@ -175,29 +698,53 @@ class AnimeFLV(object):
         :rtype: list[AnimeInfo]
         """
 
-        if page is not None and not isinstance(page, int):
-            raise TypeError
+        return self.search_page(query, page).animes
+
+    def search_page(self, query: str = None, page: int = None) -> SearchPage:
+        """
+        Search in animeflv.net by query, along with the amount of result pages.
+
+        :param query: Query information like: 'Nanatsu no Taizai'.
+        :param page: Page of the information return, the first by default.
+        :rtype: SearchPage
+        """
+
+        def fetch() -> SearchPage:
+            animes, page_count = self._parser.browse_page(self._get(browse_url(query, page)))
+            return SearchPage(animes=self._remember(animes), page=page or 1, page_count=page_count)
 
-        params = dict()
-        if query is not None:
-            params["q"] = query
-        if page is not None:
-            params["page"] = page
-        params = urlencode(params)
+        return self._once(("search", query, page or 1), fetch)
 
-        url = f"{BROWSE_URL}"
-        if params != "":
-            url += f"?{params}"
+    def search_iter(
+        self, query: str = None, max_results: int = None, page: int = None
+    ) -> Iterator[AnimeInfo]:
+        """
+        Search in animeflv.net by query walking every result page.
 
-        response = self._scraper.get(url)
-        soup = BeautifulSoup(response.text, "lxml")
+        Animes are yielded as soon as their page is parsed and the next page is only
+        requested once the previous one is consumed, so stop iterating (or `close` the
+        iterator) to cancel the search without any further request.
 
-        elements = soup.select("div.Container ul.ListAnimes li article")
+        :param query: Query information like: 'Nanatsu no Taizai'.
+        :param max_results: Stop after this amount of animes.
+        :param page: Page to start from, the first by default.
+        :rtype: Iterator[AnimeInfo]
+        """
 
-        if elements is None:
-            raise AnimeFLVParseError("Unable to get list of animes")
+        page = page or 1
+        count = 0
 
-        return self._process_anime_list_info(elements)
+        while True:
+            result = self.search_page(query, page)
+            for anime in result.animes:
+                if max_results is not None and count >= max_results:
+                    return
+                yield anime
+                count += 1
+
+            if not result.animes or page >= result.page_count:
+                return
+            page += 1
 
     def get_video_servers(
         self,
@@ -215,24 +762,7 @@ class AnimeFLV(object):
         :rtype: list
         """
 
-        response = self._scraper.get(f"{ANIME_VIDEO_URL}{id}-{episode}")
-        soup = BeautifulSoup(response.text, "lxml")
-        scripts = soup.find_all("script")
-
-        servers = []
-
-        for script in scripts:
-            content = str(script)
-            if "var videos = {" in content:
-                videos = content.split("var videos = ")[1].split(";")[0]
-                data = json.loads(videos)
-
-                if "SUB" in data and EpisodeFormat.Subtitled in format:
-                    servers.append(data["SUB"])
-                if "LAT" in data and EpisodeFormat.Dubbed in format:
-                    servers.append(data["LAT"])
-
-        return servers
+        return self.get_episode_page(id, episode).get_video_servers(format)
 
     def get_latest_episodes(self) -> List[EpisodeInfo]:
         """
@@ -242,27 +772,9 @@ class AnimeFLV(object):
         :rtype: list
         """
 
-        response = self._scraper.get(BASE_URL)
-        soup = BeautifulSoup(response.text, "lxml")
-
-        elements = soup.select("ul.ListEpisodios li a")
-        ret = []
-
-        for element in elements:
-            try:
-                anime, _, id = element["href"].rpartition("-")
-
-                ret.append(
-                    EpisodeInfo(
-                        id=id,
-                        anime=removeprefix(anime, "/ver/"),
-                        image_preview=f"{BASE_URL}{element.select_one('span.Image img').get('src')}",
-                    )
-                )
-            except Exception as exc:
-                raise AnimeFLVParseError(exc)
-
-        return ret
+        return self._once(
+            ("latest_episodes",), lambda: self._parser.latest_episodes(self._get(BASE_URL))
+        )
 
     def get_latest_animes(self) -> List[AnimeInfo]:
         """
@@ -272,15 +784,10 @@ class AnimeFLV(object):
         :rtype: list
         """
 
-        response = self._scraper.get(BASE_URL)
-        soup = BeautifulSoup(response.text, "lxml")
-
-        elements = soup.select("ul.ListAnimes li article")
-
-        if elements is None:
-            raise AnimeFLVParseError("Unable to get list of animes")
-
-        return self._process_anime_list_info(elements)
+        return self._once(
+            ("latest_animes",),
+            lambda: self._remember(self._parser.latest_animes(self._get(BASE_URL))),
+        )
 
     def get_anime_info(self, id: str) -> AnimeInfo:
         """
@@ -290,123 +797,38 @@ class AnimeFLV(object):
         :param id: Anime id, like as 'nanatsu-no-taizai'.
         :rtype: dict
         """
-        response = self._scraper.get(f"{ANIME_URL}/{id}")
-        soup = BeautifulSoup(response.text, "lxml")
-
-        synopsis = soup.select_one(
-            "body div div div div div main section div.Description p"
-        ).string
-
-        information = {
-            "title": soup.select_one(
-                "body div.Wrapper div.Body div div.Ficha.fchlt div.Container h1.Title"
-            ).string,
-            "poster": BASE_URL
-            + "/"
-            + soup.select_one(
-                "body div div div div div aside div.AnimeCover div.Image figure img"
-            ).get("src", ""),
-            "synopsis": synopsis.strip() if synopsis else None,
-            "rating": soup.select_one(
-                "body div div div.Ficha.fchlt div.Container div.vtshr div.Votes span#votes_prmd"
-            ).string,
-            "debut": soup.select_one(
-                "body div.Wrapper div.Body div div.Container div.BX.Row.BFluid.Sp20 aside.SidebarA.BFixed p.AnmStts"
-            ).string,
-            "type": soup.select_one(
-                "body div.Wrapper div.Body div div.Ficha.fchlt div.Container span.Type"
-            ).string,
-        }
-        information["banner"] = (
-            information["poster"].replace("covers", "banners").strip()
+        return self._once(
+            ("anime_info", id),
+            lambda: self._remember([self._parser.anime_info(self._get(anime_url(id)), id)])[0],
         )
-        genres = []
 
-        for element in soup.select("main.Main section.WdgtCn nav.Nvgnrs a"):
-            if "=" in element["href"]:
-                genres.append(element["href"].split("=")[1])
+    def _once(self, key: Tuple, fn: Callable[[], T]) -> T:
+        # Concurrent callers of every client sharing `flight` get the result of a single fetch
+        if self._flight is None:
+            return fn()
+        return self._flight.do(key, fn)
 
-        info_ids = []
-        episodes_data = []
-        episodes = []
+    def _remember(self, animes: List[AnimeInfo]) -> List[AnimeInfo]:
+        if self._catalog is not None:
+            self._catalog.add(animes)
+        return animes
 
-        try:
-            for script in soup.find_all("script"):
-                contents = str(script)
-
-                if "var anime_info = [" in contents:
-                    anime_info = contents.split("var anime_info = ")[1].split(";")[0]
-                    info_ids.append(json.loads(anime_info))
-
-                if "var episodes = [" in contents:
-                    data = contents.split("var episodes = ")[1].split(";")[0]
-                    episodes_data.extend(json.loads(data))
-
-            AnimeThumbnailsId = info_ids[0][0]
-            animeId = info_ids[0][2]
-            # nextEpisodeDate = info_ids[0][3] if len(info_ids[0]) > 4 else None
-
-            for episode, _ in episodes_data:
-                episodes.append(
-                    EpisodeInfo(
-                        id=episode,
-                        anime=id,
-                        image_preview=f"{BASE_EPISODE_IMG_URL}{AnimeThumbnailsId}/{episode}/th_3.jpg",
-                    )
-                )
-
-        except Exception as exc:
-            raise AnimeFLVParseError(exc)
+    def _get(self, url: str) -> str:
+        if self._cache is not None:
+            text = self._cache.get(url)
+            if text is not None:
+                return text
 
-        return AnimeInfo(
-            id=id,
-            episodes=episodes,
-            genres=genres,
-            **information,
-        )
+        return self._once(("get", url), lambda: self._fetch(url))
 
+    def _fetch(self, url: str) -> str:
+        response = self._scraper.get(url, timeout=self._timeout)
+        response.raise_for_status()
 
-    def _process_anime_list_info(self, elements: ResultSet) -> List[AnimeInfo]:
-        ret = []
+        if self._cache is not None:
+            self._cache.set(url, response.text)
 
-        for element in elements:
-            try:
-                ret.append(
-                    AnimeInfo(
-                        id=removeprefix(
-                            element.select_one("div.Description a.Button")["href"][1:],
-                            "anime/",
-                        ),
-                        title=element.select_one("a h3").string,
-                        poster=(
-                            element.select_one("a div.Image figure img").get(
-                                "src", None
-                            )
-                            or element.select_one("a div.Image figure img")["data-cfsrc"]
-                        ),
-                        banner=(
-                            element.select_one("a div.Image figure img").get(
-                                "src", None
-                            )
-                            or element.select_one("a div.Image figure img")["data-cfsrc"]
-                        )
-                        .replace("covers", "banners")
-                        .strip(),
-                        type=element.select_one("div.Description p span.Type").string,
-                        synopsis=(
-                            element.select("div.Description p")[1].string.strip()
-                            if element.select("div.Description p")[1].string
-                            else None
-                        ),
-                        rating=element.select_one("div.Description p span.Vts").string,
-                        debut=(
-                            element.select_one("a span.Estreno").string.lower()
-                            if element.select_one("a span.Estreno")
-                            else None
-                        ),
-                    )
-                )
-            except Exception as exc:
-                raise AnimeFLVParseError(exc)
+        return response.text
 
-        return ret
+    def _process_anime_list_info(self, elements: ResultSet) -> List[AnimeInfo]:
+        return process_anime_list_info(elements)
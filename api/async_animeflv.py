@@ -0,0 +1,298 @@
+import asyncio
+import aiohttp
+import cloudscraper
+
+from typing import AsyncIterator, Dict, List, Optional, Type
+from types import TracebackType
+from .cache import ResponseCache
+from .singleflight import AsyncSingleFlight
+from .animeflv import (
+    ANIME_VIDEO_URL,
+    BASE_URL,
+    AnimeInfo,
+    DownloadLinkInfo,
+    EpisodeFormat,
+    EpisodeInfo,
+    EpisodePage,
+    SearchPage,
+    anime_url,
+    browse_url,
+    get_parser,
+    merge_search_pages,
+)
+
+
+class AsyncAnimeFLV(object):
+    """
+    Asynchronous counterpart of `AnimeFLV`.
+
+    Every method is a coroutine sharing a single `aiohttp.ClientSession`, whose connector
+    keeps a pool of keep-alive connections to animeflv.net, so many lookups can be awaited
+    concurrently (e.g. with `asyncio.gather`). The Cloudflare challenge is solved once with
+    cloudscraper and its cookies and User-Agent are reused by the pool.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._limit: int = kwargs.get("limit", 32)
+        self._limit_per_host: int = kwargs.get("limit_per_host", 16)
+        self._timeout = aiohttp.ClientTimeout(total=kwargs.get("timeout", 30))
+        self._session: Optional[aiohttp.ClientSession] = kwargs.get("session", None)
+        self._parser = get_parser(kwargs.get("parser", "bs4"))
+        self._owns_session = self._session is None
+        self._cache: Optional[ResponseCache] = kwargs.get("cache", None)
+        self._catalog = kwargs.get("catalog", None)
+        # Concurrent coroutines asking for the same resource share a single fetch
+        self._flight: AsyncSingleFlight = kwargs.get("flight", None) or AsyncSingleFlight()
+        self._clearance = 0
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def close(self) -> None:
+        if self._session is not None and self._owns_session:
+            await self._session.close()
+        self._session = None
+
+    async def __aenter__(self) -> "AsyncAnimeFLV":
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_val: Optional[BaseException],
+        exc_tb: Optional[TracebackType],
+    ) -> None:
+        await self.close()
+
+    async def get_links(
+        self,
+        id: str,
+        format: EpisodeFormat = EpisodeFormat.Subtitled,
+        **kwargs,
+    ) -> List[DownloadLinkInfo]:
+        """
+        Get download links of specific episode.
+
+        :param id: Episode id, like as 'nanatsu-no-taizai-1'.
+        :param format: Formats to keep.
+        :rtype: list[DownloadLinkInfo]
+        """
+        return (await self.get_episode_page(id)).get_links(format)
+
+    async def get_episode_page(self, id: str, episode: int = None) -> EpisodePage:
+        """
+        Get the download links and the in video servers of an episode, in every format,
+        with a single request.
+
+        :param id: Episode id, like as 'nanatsu-no-taizai-1', or anime id along with
+            `episode`.
+        :param episode: Episode number, like as 1.
+        :rtype: EpisodePage
+        """
+        if episode is not None:
+            id = f"{id}-{episode}"
+
+        async def fetch() -> EpisodePage:
+            return self._parser.episode_page(await self._get(f"{ANIME_VIDEO_URL}{id}"))
+
+        return await self._flight.do(("episode_page", id), fetch)
+
+    async def list(self, page: int = None) -> List[AnimeInfo]:
+        """
+        Shortcut for search(query=None)
+        """
+
+        return await self.search(page=page)
+
+    async def search(self, query: str = None, page: int = None) -> List[AnimeInfo]:
+        """
+        Search in animeflv.net by query.
+
+        :param query: Query information like: 'Nanatsu no Taizai'.
+        :param page: Page of the information return.
+        :rtype: list[AnimeInfo]
+        """
+        return (await self.search_page(query, page)).animes
+
+    async def search_page(self, query: str = None, page: int = None) -> SearchPage:
+        """
+        Search in animeflv.net by query, along with the amount of result pages.
+
+        :param query: Query information like: 'Nanatsu no Taizai'.
+        :param page: Page of the information return, the first by default.
+        :rtype: SearchPage
+        """
+
+        async def fetch() -> SearchPage:
+            animes, page_count = self._parser.browse_page(await self._get(browse_url(query, page)))
+            return SearchPage(animes=self._remember(animes), page=page or 1, page_count=page_count)
+
+        return await self._flight.do(("search", query, page or 1), fetch)
+
+    async def search_iter(
+        self, query: str = None, max_results: int = None, page: int = None
+    ) -> AsyncIterator[AnimeInfo]:
+        """
+        Search in animeflv.net by query walking every result page.
+
+        Animes are yielded as soon as their page is parsed and the next page is only
+        requested once the previous one is consumed, so break out of the `async for` (or
+        `aclose` the iterator) to cancel the search without any further request.
+
+        :param query: Query information like: 'Nanatsu no Taizai'.
+        :param max_results: Stop after this amount of animes.
+        :param page: Page to start from, the first by default.
+        :rtype: AsyncIterator[AnimeInfo]
+        """
+        page = page or 1
+        count = 0
+
+        while True:
+            result = await self.search_page(query, page)
+            for anime in result.animes:
+                if max_results is not None and count >= max_results:
+                    return
+                yield anime
+                count += 1
+
+            if not result.animes or page >= result.page_count:
+                return
+            page += 1
+
+    async def search_all(
+        self, query: str = None, max_pages: int = None, max_concurrency: int = 8
+    ) -> List[AnimeInfo]:
+        """
+        Search in animeflv.net by query, returning the animes of every result page.
+
+        The first page gives the amount of pages and the rest are requested concurrently,
+        so the search takes about as long as the two slowest pages. Animes repeated across
+        pages are returned once.
+
+        :param query: Query information like: 'Nanatsu no Taizai'.
+        :param max_pages: Don't request more than this amount of pages.
+        :param max_concurrency: Maximum amount of pages requested at the same time.
+        :rtype: list[AnimeInfo]
+        """
+        first = await self.search_page(query)
+        last = first.page_count if max_pages is None else min(first.page_count, max_pages)
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def fetch(page: int) -> SearchPage:
+            async with semaphore:
+                return await self.search_page(query, page)
+
+        rest = await asyncio.gather(*(fetch(page) for page in range(2, last + 1)))
+        return merge_search_pages([first, *rest])
+
+    async def get_video_servers(
+        self,
+        id: str,
+        episode: int,
+        format: EpisodeFormat = EpisodeFormat.Subtitled,
+        **kwargs,
+    ) -> List[Dict[str, str]]:
+        """
+        Get in video servers, this work only using the iframe element.
+
+        :param id: Anime id, like as 'nanatsu-no-taizai'.
+        :param episode: Episode id, like as '1'.
+        :rtype: list
+        """
+        return (await self.get_episode_page(id, episode)).get_video_servers(format)
+
+    async def get_latest_episodes(self) -> List[EpisodeInfo]:
+        """
+        Get a list of new episodes released (possibly this last week).
+
+        :rtype: list[EpisodeInfo]
+        """
+        return self._parser.latest_episodes(await self._get(BASE_URL))
+
+    async def get_latest_animes(self) -> List[AnimeInfo]:
+        """
+        Get a list of new animes released.
+
+        :rtype: list[AnimeInfo]
+        """
+        return self._remember(self._parser.latest_animes(await self._get(BASE_URL)))
+
+    async def get_anime_info(self, id: str) -> AnimeInfo:
+        """
+        Get information about specific anime.
+
+        :param id: Anime id, like as 'nanatsu-no-taizai'.
+        :rtype: AnimeInfo
+        """
+
+        async def fetch() -> AnimeInfo:
+            return self._remember([self._parser.anime_info(await self._get(anime_url(id)), id)])[0]
+
+        return await self._flight.do(("anime_info", id), fetch)
+
+    def _remember(self, animes: List[AnimeInfo]) -> List[AnimeInfo]:
+        if self._catalog is not None:
+            self._catalog.add(animes)
+        return animes
+
+    async def _get(self, url: str) -> str:
+        if self._cache is not None:
+            text = self._cache.get(url)
+            if text is not None:
+                return text
+
+        return await self._flight.do(("get", url), lambda: self._fetch(url))
+
+    async def _fetch(self, url: str) -> str:
+        session = await self._connect()
+        clearance = self._clearance
+
+        async with session.get(url) as response:
+            status, text = response.status, await response.text()
+
+        if status in (403, 503):
+            # Clearance expired, solve the challenge again and retry once
+            await self._clear(expired=clearance)
+            async with session.get(url) as response:
+                status, text = response.status, await response.text()
+
+        if status >= 400:
+            raise aiohttp.ClientResponseError(
+                response.request_info, response.history, status=status, message=response.reason
+            )
+
+        if self._cache is not None:
+            self._cache.set(url, text)
+
+        return text
+
+    async def _connect(self) -> aiohttp.ClientSession:
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self._limit, limit_per_host=self._limit_per_host
+                ),
+                timeout=self._timeout,
+            )
+        if not self._clearance:
+            await self._clear()
+        return self._session
+
+    async def _clear(self, expired: Optional[int] = None) -> None:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            # Concurrent callers that saw the same expired clearance only solve it once
+            if self._clearance and self._clearance != expired:
+                return
+            cookies, user_agent = await asyncio.get_running_loop().run_in_executor(
+                None, _solve_challenge
+            )
+            self._session.cookie_jar.update_cookies(cookies)
+            self._session.headers["User-Agent"] = user_agent
+            self._clearance += 1
+
+
+def _solve_challenge():
+    with cloudscraper.create_scraper() as scraper:
+        scraper.get(BASE_URL)
+        return scraper.cookies.get_dict(), scraper.headers["User-Agent"]
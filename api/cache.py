@@ -0,0 +1,174 @@
+import sqlite3
+import threading
+import time
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Sequence, Tuple
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    memory_hits: int = 0
+    disk_hits: int = 0
+    evictions: int = 0
+
+
+class ResponseCache(object):
+    """
+    Cache of response bodies keyed by url.
+
+    Entries live in an in-memory LRU bounded by `max_bytes` and, if `path` is given, in a
+    SQLite database bounded by `disk_max_bytes` that survives restarts. The time to live of
+    an entry is picked from `ttls`, a sequence of `(url prefix, seconds)` where the longest
+    matching prefix wins, falling back to `default_ttl`. A ttl of 0 disables caching for
+    that prefix.
+
+    Safe to share between threads.
+    """
+
+    def __init__(
+        self,
+        ttls: Sequence[Tuple[str, float]] = (),
+        default_ttl: float = 300,
+        max_bytes: int = 64 * 1024 * 1024,
+        path: Optional[str] = None,
+        disk_max_bytes: int = 512 * 1024 * 1024,
+    ):
+        self._ttls = sorted(ttls, key=lambda rule: len(rule[0]), reverse=True)
+        self._default_ttl = default_ttl
+        self._max_bytes = max_bytes
+        self._disk_max_bytes = disk_max_bytes
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.stats = CacheStats()
+
+        self._db: Optional[sqlite3.Connection] = None
+        if path is not None:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "url TEXT PRIMARY KEY, body TEXT NOT NULL, size INTEGER NOT NULL, "
+                "expires REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)"
+            )
+            self._db.commit()
+
+    def ttl(self, url: str) -> float:
+        for prefix, ttl in self._ttls:
+            if url.startswith(prefix):
+                return ttl
+        return self._default_ttl
+
+    def get(self, url: str) -> Optional[str]:
+        """
+        Return the cached body of `url`, or None if it is missing or expired.
+        """
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(url)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(url)
+                    self.stats.hits += 1
+                    self.stats.memory_hits += 1
+                    return entry[1]
+                self._discard(url)
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT body, expires FROM responses WHERE url = ? AND expires > ?",
+                    (url, now),
+                ).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE responses SET accessed = ? WHERE url = ?", (now, url)
+                    )
+                    self._db.commit()
+                    self._remember(url, row[1], row[0])
+                    self.stats.hits += 1
+                    self.stats.disk_hits += 1
+                    return row[0]
+
+            self.stats.misses += 1
+            return None
+
+    def set(self, url: str, body: str) -> None:
+        ttl = self.ttl(url)
+        if ttl <= 0:
+            return
+
+        now = time.time()
+        expires = now + ttl
+
+        with self._lock:
+            self._remember(url, expires, body)
+
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (url, body, size, expires, accessed) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (url, body, len(body), expires, now),
+                )
+                self._evict_disk(now)
+                self._db.commit()
+
+    def invalidate(self, url: str) -> None:
+        with self._lock:
+            self._discard(url)
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses WHERE url = ?", (url,))
+                self._db.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._size = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _remember(self, url: str, expires: float, body: str) -> None:
+        self._discard(url)
+        if len(body) > self._max_bytes:
+            return
+
+        self._memory[url] = (expires, body)
+        self._size += len(body)
+
+        while self._size > self._max_bytes:
+            _, (_, evicted) = self._memory.popitem(last=False)
+            self._size -= len(evicted)
+            self.stats.evictions += 1
+
+    def _discard(self, url: str) -> None:
+        entry = self._memory.pop(url, None)
+        if entry is not None:
+            self._size -= len(entry[1])
+
+    def _evict_disk(self, now: float) -> None:
+        self._db.execute("DELETE FROM responses WHERE expires <= ?", (now,))
+        (size,) = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if size <= self._disk_max_bytes:
+            return
+
+        for url, entry_size in self._db.execute(
+            "SELECT url, size FROM responses ORDER BY accessed"
+        ).fetchall():
+            if size <= self._disk_max_bytes:
+                break
+            self._db.execute("DELETE FROM responses WHERE url = ?", (url,))
+            size -= entry_size
+            self.stats.evictions += 1
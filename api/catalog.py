@@ -0,0 +1,243 @@
+import json, re
+import sqlite3
+import threading
+import time
+
+from typing import Iterable, List, Optional
+from .animeflv import AnimeInfo
+from .fuzzy import FuzzyIndex, normalize
+
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+_FIELDS = ("title", "poster", "banner", "synopsis", "rating", "genres", "debut", "type")
+
+
+class AnimeCatalog(object):
+    """
+    Local catalog of every anime seen, searchable with SQLite FTS5.
+
+    Titles and ids are indexed case and accent insensitive ('accion' finds 'Acción') and
+    every word of a query matches as a prefix ('shin kyo' finds 'Shingeki no Kyojin').
+    Entries remember when they were last seen upstream so callers can ignore stale ones.
+    `fuzzy_search` also finds titles with typos.
+
+    The catalog only holds the animes seen by chance, so `search` only answers queries
+    whose complete upstream results were recorded with `add_search`, or queries narrowing
+    one of them.
+
+    Safe to share between threads.
+
+    :param path: SQLite database, kept in memory by default.
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS animes (
+                id TEXT PRIMARY KEY,
+                title TEXT NOT NULL,
+                poster TEXT,
+                banner TEXT,
+                synopsis TEXT,
+                rating TEXT,
+                genres TEXT,
+                debut TEXT,
+                type TEXT,
+                updated REAL NOT NULL
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS animes_fts USING fts5(
+                id UNINDEXED, title, slug, tokenize = 'unicode61 remove_diacritics 2'
+            );
+            CREATE TABLE IF NOT EXISTS searches (
+                query TEXT PRIMARY KEY,
+                ids TEXT NOT NULL,
+                updated REAL NOT NULL
+            );
+            """
+        )
+        self._db.commit()
+        self._fuzzy = FuzzyIndex(
+            self._anime(row)
+            for row in self._db.execute(f"SELECT id, {', '.join(_FIELDS)} FROM animes")
+        )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM animes").fetchone()[0]
+
+    def add(self, animes: Iterable[AnimeInfo]) -> None:
+        """
+        Insert or refresh animes. Fields missing in the new data keep their old value, so
+        a search card doesn't erase the genres read from the anime page.
+        """
+        now = time.time()
+        animes = [anime for anime in animes if anime.id and anime.title]
+
+        with self._lock:
+            for anime in animes:
+                values = [
+                    json.dumps(anime.genres) if field == "genres" and anime.genres is not None
+                    else getattr(anime, field)
+                    for field in _FIELDS
+                ]
+                self._db.execute(
+                    f"INSERT INTO animes (id, {', '.join(_FIELDS)}, updated) "
+                    f"VALUES (?, {', '.join('?' for _ in _FIELDS)}, ?) "
+                    f"ON CONFLICT (id) DO UPDATE SET "
+                    + ", ".join(
+                        f"{field} = COALESCE(excluded.{field}, {field})" for field in _FIELDS
+                    )
+                    + ", updated = excluded.updated",
+                    [str(anime.id), *values, now],
+                )
+                # The index row shares the rowid of the anime, refreshing it is a replace
+                (rowid,) = self._db.execute(
+                    "SELECT rowid FROM animes WHERE id = ?", (str(anime.id),)
+                ).fetchone()
+                self._db.execute(
+                    "INSERT OR REPLACE INTO animes_fts (rowid, id, title, slug) VALUES (?, ?, ?, ?)",
+                    (rowid, str(anime.id), anime.title, str(anime.id).replace("-", " ")),
+                )
+            self._db.commit()
+
+        self._fuzzy.add(animes)
+
+    def add_search(self, query: str, animes: List[AnimeInfo]) -> None:
+        """
+        Record that `animes` are every result of `query` upstream, in their order.
+
+        :param query: Query information like: 'nanatsu taizai'.
+        :param animes: the complete upstream results, not only their first pages.
+        """
+        self.add(animes)
+        key = normalize(query)
+        if not key:
+            return
+
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO searches (query, ids, updated) VALUES (?, ?, ?)",
+                (key, json.dumps([str(anime.id) for anime in animes]), time.time()),
+            )
+            self._db.commit()
+
+    def get(self, id: str) -> Optional[AnimeInfo]:
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT id, {', '.join(_FIELDS)} FROM animes WHERE id = ?", (id,)
+            ).fetchone()
+        return self._anime(row) if row else None
+
+    def search(
+        self, query: str, limit: int = 50, max_age: Optional[float] = None
+    ) -> Optional[List[AnimeInfo]]:
+        """
+        Search animes by title or id, answering only from complete upstream results.
+
+        A query recorded with `add_search` gets its upstream results back in the same order.
+        A query extending a recorded one, where every word of the recorded query is the
+        prefix of one of its words ('one' for 'one piece'), is searched among the results of
+        the recorded query, best matches first.
+
+        :param query: Query information like: 'nanatsu taizai'.
+        :param limit: Maximum amount of results.
+        :param max_age: Ignore searches recorded more than this amount of seconds ago.
+        :rtype: list[AnimeInfo] or None if no recorded search covers the query.
+        """
+        key = normalize(query)
+        words = key.split()
+        if not words:
+            return None
+
+        oldest = 0 if max_age is None else time.time() - max_age
+
+        with self._lock:
+            recorded = self._db.execute(
+                "SELECT query, ids FROM searches WHERE updated >= ?", (oldest,)
+            ).fetchall()
+
+        exact = next((json.loads(ids) for recorded_query, ids in recorded if recorded_query == key), None)
+        if exact is not None:
+            return self._animes(exact[:limit])
+
+        covering = [
+            json.loads(ids)
+            for recorded_query, ids in recorded
+            if all(any(word.startswith(part) for word in words) for part in recorded_query.split())
+        ]
+        if not covering:
+            return None
+
+        ids = min(covering, key=len)
+        if not ids:
+            return []
+
+        match = " ".join(f'"{word}"*' for word in _WORD.findall(query))
+
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT a.id, {', '.join('a.' + field for field in _FIELDS)} "
+                "FROM animes_fts f JOIN animes a ON a.rowid = f.rowid "
+                f"WHERE animes_fts MATCH ? AND a.id IN ({', '.join('?' for _ in ids)}) "
+                "ORDER BY bm25(animes_fts, 0.0, 10.0, 1.0) LIMIT ?",
+                (match, *ids, limit),
+            ).fetchall()
+
+        return [self._anime(row) for row in rows]
+
+    def fuzzy_search(
+        self,
+        query: str,
+        limit: int = 20,
+        max_age: Optional[float] = None,
+        min_score: float = 0.5,
+    ) -> List[AnimeInfo]:
+        """
+        Search animes by title or id tolerating typos, best matches first.
+
+        :param query: Query information like: 'nanatsu no taisai'.
+        :param limit: Maximum amount of results.
+        :param max_age: Ignore entries not seen upstream in this amount of seconds.
+        :param min_score: Minimum similarity, between 0 and 1, of the results.
+        :rtype: list[AnimeInfo]
+        """
+        found = [anime for anime, _ in self._fuzzy.search(query, limit, min_score)]
+        if max_age is None or not found:
+            return found
+
+        with self._lock:
+            fresh = {
+                id
+                for (id,) in self._db.execute(
+                    f"SELECT id FROM animes WHERE updated >= ? AND id IN ({', '.join('?' for _ in found)})",
+                    [time.time() - max_age, *(str(anime.id) for anime in found)],
+                )
+            }
+        return [anime for anime in found if str(anime.id) in fresh]
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def _animes(self, ids: List[str]) -> List[AnimeInfo]:
+        # Animes of `ids` in that order, skipping unknown ones
+        if not ids:
+            return []
+
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT id, {', '.join(_FIELDS)} FROM animes WHERE id IN ({', '.join('?' for _ in ids)})",
+                ids,
+            ).fetchall()
+
+        found = {row[0]: self._anime(row) for row in rows}
+        return [found[id] for id in ids if id in found]
+
+    def _anime(self, row) -> AnimeInfo:
+        values = dict(zip(_FIELDS, row[1:]))
+        if values["genres"] is not None:
+            values["genres"] = json.loads(values["genres"])
+        return AnimeInfo(id=row[0], **values)
@@ -1,2 +1,6 @@
 class AnimeFLVParseError(Exception):
+    pass
+
+
+class AnimeFLVPoolTimeout(Exception):
     pass
\ No newline at end of file
@@ -0,0 +1,362 @@
+import json, re, time
+
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+from lxml import etree, html as lxml_html
+from .exception import AnimeFLVParseError
+
+
+_SIMPLE_SELECTOR = re.compile(r"^([a-zA-Z0-9]*)((?:[.#][\w-]+)*)$")
+
+
+def css_to_xpath(selector: str, relative: bool = False) -> etree.XPath:
+    """
+    Compile a CSS selector made of descendant combinators and `tag.class#id` compound
+    selectors into an XPath with the same matches, in document order.
+
+    The rightmost compound is the location step and the rest become nested `ancestor::`
+    predicates, so only the candidates of the last step are tested instead of walking the
+    tree once per compound.
+
+    :param selector: CSS selector, like as 'div.Container ul.ListAnimes li article'.
+    :param relative: match descendants of the context element instead of the document.
+    :rtype: etree.XPath
+    """
+
+    def compound(part: str) -> str:
+        match = _SIMPLE_SELECTOR.match(part)
+        if match is None:
+            raise ValueError(f"Unsupported selector: {part}")
+
+        step = match.group(1) or "*"
+        for name in re.findall(r"[.#][\w-]+", match.group(2)):
+            if name[0] == ".":
+                step += f"[contains(concat(' ', normalize-space(@class), ' '), ' {name[1:]} ')]"
+            else:
+                step += f"[@id='{name[1:]}']"
+        return step
+
+    parts = selector.split()
+    expression = compound(parts[0])
+    for part in parts[1:]:
+        expression = f"{compound(part)}[ancestor::{expression}]"
+
+    return etree.XPath(f"{'.' if relative else ''}//{expression}")
+
+
+def string(element: Optional[etree.ElementBase]) -> Optional[str]:
+    """
+    Equivalent of BeautifulSoup's `Tag.string`: the text of an element with a single
+    child, descending while that child is an element.
+    """
+    if element is None:
+        raise AnimeFLVParseError("Element not found")
+
+    while len(element):
+        if len(element) > 1 or element.text or element[0].tail:
+            return None
+        element = element[0]
+        if not isinstance(element.tag, str):
+            # Comments and processing instructions
+            return element.text
+
+    return element.text
+
+
+_SCRIPTS = etree.XPath("//script")
+
+
+class Page(object):
+    """
+    A parsed document and the text of its scripts, collected once and shared by every
+    field of a spec, and the profile timing them.
+    """
+
+    __slots__ = ("document", "profile", "_scripts")
+
+    def __init__(self, document: etree.ElementBase, profile: Optional["Profile"] = None):
+        self.document = document
+        self.profile = profile
+        self._scripts: Optional[List[str]] = None
+
+    @property
+    def scripts(self) -> List[str]:
+        if self._scripts is None:
+            self._scripts = [script.text or "" for script in _SCRIPTS(self.document)]
+        return self._scripts
+
+
+class Select(object):
+    """
+    Elements matching a CSS selector under the context element, as their text or the
+    value of an attribute.
+
+    :param selector: CSS selector, see `css_to_xpath`.
+    :param attr: attribute to read instead of the text. With several names the first one
+        not empty is read.
+    :param many: every match as a list instead of a single one.
+    :param index: which match to take when not `many`.
+    :param required: raise `AnimeFLVParseError` when there's no match, otherwise None.
+    """
+
+    def __init__(
+        self,
+        selector: str,
+        attr: Union[str, Tuple[str, ...], None] = None,
+        many: bool = False,
+        index: int = 0,
+        required: bool = True,
+    ):
+        self.selector = selector
+        self.attrs = (attr,) if isinstance(attr, str) else attr
+        self.many = many
+        self.index = index
+        self.required = required
+        self._xpath = css_to_xpath(selector, relative=True)
+
+    def __call__(self, element: etree.ElementBase, page: Page) -> Any:
+        found = self._xpath(element)
+
+        if self.many:
+            return [self._value(match) for match in found]
+        if len(found) <= self.index:
+            if self.required:
+                raise AnimeFLVParseError(f"Element not found: {self.selector}")
+            return None
+        return self._value(found[self.index])
+
+    def _value(self, element: etree.ElementBase) -> Optional[str]:
+        if self.attrs is None:
+            return string(element)
+        for attr in self.attrs:
+            value = element.get(attr)
+            if value:
+                return value
+        return None
+
+
+class Attr(object):
+    """
+    Attribute of the context element itself.
+
+    :param name: attribute name, like as 'href'.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __call__(self, element: etree.ElementBase, page: Page) -> str:
+        try:
+            return element.attrib[self.name]
+        except KeyError:
+            raise AnimeFLVParseError(f"Attribute not found: {self.name}")
+
+
+class Table(object):
+    """
+    Rows of the first table matching a CSS selector, as dicts of header text to cell.
+
+    :param selector: CSS selector of the table, like as 'table.RTbl'.
+    """
+
+    def __init__(self, selector: str):
+        self.selector = selector
+        self._xpath = css_to_xpath(selector, relative=True)
+
+    def __call__(self, element: etree.ElementBase, page: Page) -> List[Dict[str, etree.ElementBase]]:
+        found = self._xpath(element)
+        if not found:
+            raise AnimeFLVParseError(f"Element not found: {self.selector}")
+
+        try:
+            table = found[0]
+            columns = [string(th) for th in table.find(".//thead").find(".//tr").iter("th")]
+            rows = []
+
+            for row in table.find(".//tbody").iter("tr"):
+                values = list(row.iter("td"))
+
+                if len(values) != len(columns):
+                    raise AnimeFLVParseError("Don't match values size with columns size")
+
+                rows.append(dict(zip(columns, values)))
+
+            return rows
+        except AnimeFLVParseError:
+            raise
+        except Exception as exc:
+            raise AnimeFLVParseError(exc)
+
+
+class Embedded(object):
+    """
+    JSON assigned to a variable in the scripts of the page, like as
+    `var episodes = [[1, 123]];`. Every script assigning it adds its value, in document
+    order.
+
+    :param name: variable name.
+    :param opening: first character of the value, scripts assigning anything else are
+        skipped.
+    """
+
+    def __init__(self, name: str, opening: str = "["):
+        self.name = name
+        self._marker = f"var {name} = {opening}"
+        self._value = re.compile(rf"var {re.escape(name)} = ([^;]*)")
+
+    def __call__(self, element: etree.ElementBase, page: Page) -> List[Any]:
+        return [
+            json.loads(self._value.search(contents).group(1))
+            for contents in page.scripts
+            if self._marker in contents
+        ]
+
+
+class Items(object):
+    """
+    A record per element matching a CSS selector, extracted with a nested spec.
+
+    :param selector: CSS selector of the items, like as 'ul.ListAnimes li article'.
+    :param spec: fields of every item.
+    """
+
+    def __init__(self, selector: str, spec: "Spec"):
+        self.selector = selector
+        self.spec = spec
+        self._xpath = css_to_xpath(selector, relative=True)
+
+    def __call__(self, element: etree.ElementBase, page: Page) -> List[Dict[str, Any]]:
+        return [self.spec.run(item, page) for item in self._xpath(element)]
+
+
+Field = Callable[[etree.ElementBase, Page], Any]
+
+
+class Profile(object):
+    """
+    Accumulated time spent on every field of the specs it's passed to, keyed as
+    '<spec>.<field>'. Nested fields are also counted in their parent.
+    """
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = defaultdict(float)
+        self.calls: Dict[str, int] = defaultdict(int)
+
+    def add(self, key: str, seconds: float) -> None:
+        self.seconds[key] += seconds
+        self.calls[key] += 1
+
+    def report(self) -> List[Tuple[str, int, float]]:
+        """
+        Fields with their amount of calls and total seconds, slowest first.
+
+        :rtype: list[tuple[str, int, float]]
+        """
+        return sorted(
+            ((key, self.calls[key], seconds) for key, seconds in self.seconds.items()),
+            key=lambda entry: entry[2],
+            reverse=True,
+        )
+
+
+class Spec(object):
+    """
+    Declarative description of what to extract from a page type. The selectors and
+    regexes of its fields are compiled when the spec is built, at import time for the
+    specs of this module, and every field runs over the same parsed document.
+
+    :param name: page type, used to key the profile.
+    :param fields: field name to extractor, like as `Select`, `Embedded` or `Items`.
+    """
+
+    def __init__(self, name: str, **fields: Field):
+        self.name = name
+        self.fields = fields
+
+    def extract(
+        self,
+        source: Union[str, bytes, etree.ElementBase],
+        profile: Optional[Profile] = None,
+    ) -> Dict[str, Any]:
+        """
+        Extract every field of a page, in one pass over the parsed document.
+
+        :param source: page html, or an already parsed document.
+        :param profile: collects the time spent on every field.
+        :rtype: dict[str, Any]
+        """
+        if isinstance(source, (str, bytes)):
+            start = time.perf_counter()
+            document = lxml_html.document_fromstring(source)
+            if profile is not None:
+                profile.add(f"{self.name}.<document>", time.perf_counter() - start)
+        else:
+            document = source
+
+        return self.run(document, Page(document, profile))
+
+    def run(self, element: etree.ElementBase, page: Page) -> Dict[str, Any]:
+        fields = self.fields.items()
+        profile = page.profile
+
+        if profile is None:
+            return {name: field(element, page) for name, field in fields}
+
+        ret = {}
+        for name, field in fields:
+            start = time.perf_counter()
+            ret[name] = field(element, page)
+            profile.add(f"{self.name}.{name}", time.perf_counter() - start)
+
+        return ret
+
+
+CARD = Spec(
+    "card",
+    href=Select("div.Description a.Button", attr="href"),
+    title=Select("a h3"),
+    poster=Select("a div.Image figure img", attr=("src", "data-cfsrc")),
+    type=Select("div.Description p span.Type"),
+    synopsis=Select("div.Description p", index=1),
+    rating=Select("div.Description p span.Vts"),
+    debut=Select("a span.Estreno", required=False),
+)
+
+EPISODE_CARD = Spec(
+    "episode_card",
+    href=Attr("href"),
+    image=Select("span.Image img", attr="src"),
+)
+
+BROWSE = Spec(
+    "browse",
+    animes=Items("div.Container ul.ListAnimes li article", CARD),
+    pages=Select("ul.pagination li a", many=True),
+)
+
+HOME = Spec(
+    "home",
+    animes=Items("ul.ListAnimes li article", CARD),
+    episodes=Items("ul.ListEpisodios li a", EPISODE_CARD),
+)
+
+ANIME = Spec(
+    "anime",
+    synopsis=Select("body div div div div div main section div.Description p"),
+    title=Select("body div.Wrapper div.Body div div.Ficha.fchlt div.Container h1.Title"),
+    poster=Select("body div div div div div aside div.AnimeCover div.Image figure img", attr="src"),
+    rating=Select("body div div div.Ficha.fchlt div.Container div.vtshr div.Votes span#votes_prmd"),
+    debut=Select(
+        "body div.Wrapper div.Body div div.Container div.BX.Row.BFluid.Sp20 aside.SidebarA.BFixed p.AnmStts"
+    ),
+    type=Select("body div.Wrapper div.Body div div.Ficha.fchlt div.Container span.Type"),
+    genres=Select("main.Main section.WdgtCn nav.Nvgnrs a", attr="href", many=True),
+    anime_info=Embedded("anime_info"),
+    episodes=Embedded("episodes"),
+)
+
+EPISODE = Spec(
+    "episode",
+    links=Table("table.RTbl"),
+    videos=Embedded("videos", opening="{"),
+)
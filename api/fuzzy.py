@@ -0,0 +1,198 @@
+import re
+import threading
+import unicodedata
+
+import numpy as np
+
+from array import array
+from typing import Dict, Iterable, List, Set, Tuple
+from .animeflv import AnimeInfo
+
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def normalize(text: str) -> str:
+    """
+    Lowercase `text`, strip its accents and turn anything that isn't a letter or digit,
+    like the dashes of an id, into single spaces.
+
+    :param text: like as 'Shingeki no Kyojin: Acción'.
+    :rtype: str
+    """
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(_WORD.findall(text.lower())).replace("_", " ")
+
+
+def trigrams(text: str) -> Set[str]:
+    """
+    Trigrams of every word of the normalized `text`, padded with two spaces in front and
+    one behind so short words and word starts weigh more.
+
+    :rtype: set[str]
+    """
+    ret = set()
+    for word in normalize(text).split():
+        padded = f"  {word} "
+        ret.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return ret
+
+
+def similarity(query: Set[str], text: Set[str]) -> float:
+    """
+    Score between 0 and 1 of how well `text` matches `query`, both trigram sets.
+
+    Mostly how much of the query is found in the text, so a typo only loses the trigrams
+    it touches and long titles containing the query still rank high, blended with the
+    overlap of both sets to prefer the closest title among those.
+    """
+    if not query or not text:
+        return 0.0
+    shared = len(query & text)
+    return 0.75 * shared / len(query) + 0.25 * shared / (len(query) + len(text) - shared)
+
+
+def rank(query: str, animes: Iterable[AnimeInfo], min_score: float = 0.0) -> List[AnimeInfo]:
+    """
+    Sort `animes` (e.g. the results of `AnimeFLV.search`) by how well their title or id
+    match `query`, best first. Ties keep their original order.
+
+    :param query: Query information like: 'nanatsu no taisai'.
+    :param animes: animes to rank.
+    :param min_score: drop animes scoring less than this.
+    :rtype: list[AnimeInfo]
+    """
+    query_trigrams = trigrams(query)
+    scored = [
+        (
+            max(
+                similarity(query_trigrams, trigrams(anime.title or "")),
+                similarity(query_trigrams, trigrams(anime.id)),
+            ),
+            anime,
+        )
+        for anime in animes
+    ]
+    return [anime for score, anime in sorted(scored, key=lambda x: -x[0]) if score >= min_score]
+
+
+class FuzzyIndex(object):
+    """
+    Typo tolerant search over the titles and ids of many animes.
+
+    Every title and id is a document of a trigram inverted index. A query counts the
+    trigrams it shares with every document at once with numpy, scores them like
+    `similarity` and returns the best animes, so tens of thousands of titles are ranked in
+    a few milliseconds. Adding is incremental.
+
+    Safe to share between threads.
+    """
+
+    def __init__(self, animes: Iterable[AnimeInfo] = ()):
+        self._lock = threading.Lock()
+        self._trigram_ids: Dict[str, int] = {}
+        self._postings: List[array] = []
+        self._sizes = array("i")
+        self._owners = array("i")
+        self._alive = array("b")
+        self._animes: List[AnimeInfo] = []
+        self._slots: Dict[str, Tuple[int, List[int]]] = {}
+        self.add(animes)
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def add(self, animes: Iterable[AnimeInfo]) -> None:
+        """
+        Index `animes`. An anime already indexed is replaced by the new one.
+        """
+        with self._lock:
+            for anime in animes:
+                id = str(anime.id)
+                slot = self._slots.get(id)
+
+                if slot is not None:
+                    owner, documents = slot
+                    if self._animes[owner].title == anime.title:
+                        self._animes[owner] = anime
+                        continue
+                    for document in documents:
+                        self._alive[document] = 0
+
+                owner = len(self._animes)
+                self._animes.append(anime)
+                documents = [
+                    self._add_document(owner, text)
+                    for text in {normalize(anime.title or ""), normalize(id)}
+                    if text
+                ]
+                self._slots[id] = (owner, documents)
+
+    def search(
+        self, query: str, limit: int = 20, min_score: float = 0.3
+    ) -> List[Tuple[AnimeInfo, float]]:
+        """
+        Best matches of `query` with their score, best first.
+
+        :param query: Query information like: 'nanatsu no taisai'.
+        :param limit: maximum amount of results.
+        :param min_score: drop results scoring less than this.
+        :rtype: list[tuple[AnimeInfo, float]]
+        """
+        query_trigrams = trigrams(query)
+
+        with self._lock:
+            postings = [
+                np.frombuffer(self._postings[self._trigram_ids[trigram]], dtype=np.int32)
+                for trigram in query_trigrams
+                if trigram in self._trigram_ids
+            ]
+            if not postings:
+                return []
+
+            documents = len(self._sizes)
+            shared = np.bincount(np.concatenate(postings), minlength=documents)
+            sizes = np.frombuffer(self._sizes, dtype=np.int32)
+            alive = np.frombuffer(self._alive, dtype=np.int8)
+            owners = np.frombuffer(self._owners, dtype=np.int32)
+
+            size = len(query_trigrams)
+            scores = 0.75 * shared / size + 0.25 * shared / (size + sizes - shared)
+            scores[alive == 0] = 0
+            scores[scores < min_score] = 0
+
+            candidates = np.flatnonzero(scores)
+            # Title and id of an anime are two documents, keep room for both
+            if len(candidates) > 2 * limit:
+                candidates = candidates[np.argpartition(-scores[candidates], 2 * limit)[: 2 * limit]]
+            candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+            ret = []
+            seen = set()
+            for document in candidates:
+                owner = owners[document]
+                if owner in seen:
+                    continue
+                seen.add(owner)
+                ret.append((self._animes[owner], float(scores[document])))
+                if len(ret) == limit:
+                    break
+
+            return ret
+
+    def _add_document(self, owner: int, text: str) -> int:
+        document = len(self._sizes)
+        text_trigrams = trigrams(text)
+
+        for trigram in text_trigrams:
+            trigram_id = self._trigram_ids.get(trigram)
+            if trigram_id is None:
+                trigram_id = self._trigram_ids[trigram] = len(self._postings)
+                self._postings.append(array("i"))
+            self._postings[trigram_id].append(document)
+
+        self._sizes.append(len(text_trigrams))
+        self._owners.append(owner)
+        self._alive.append(1)
+        return document
@@ -0,0 +1,176 @@
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import unquote
+from .animeflv import (
+    BASE_URL,
+    AnimeInfo,
+    DownloadLinkInfo,
+    EPISODE_FORMATS,
+    EpisodeFormat,
+    EpisodeInfo,
+    EpisodeList,
+    EpisodePage,
+    OUO_PREFIX,
+    removeprefix,
+)
+from .exception import AnimeFLVParseError
+from .extract import ANIME, BROWSE, EPISODE, HOME, Profile, string
+
+
+class LxmlParser(object):
+    """
+    Parses pages straight with lxml through the extraction specs of `api.extract`,
+    skipping the BeautifulSoup tree. Produces the same output as `SoupParser`.
+
+    Every page type runs its whole spec in one pass, methods returning part of a page
+    (like as `search` and `page_count`) are views over the complete result.
+
+    :param profile: collects the time spent on every field of the specs, for profiling.
+    """
+
+    def __init__(self, profile: Optional[Profile] = None):
+        self.profile = profile
+
+    def search(self, html: str) -> List[AnimeInfo]:
+        return self.browse_page(html)[0]
+
+    def page_count(self, html: str) -> int:
+        return self.browse_page(html)[1]
+
+    def browse_page(self, html: str) -> Tuple[List[AnimeInfo], int]:
+        page = BROWSE.extract(html, self.profile)
+        return self._anime_list(page["animes"]), self._page_count(page["pages"])
+
+    def latest_animes(self, html: str) -> List[AnimeInfo]:
+        return self._home_page(html)[0]
+
+    def latest_episodes(self, html: str) -> List[EpisodeInfo]:
+        return self._home_page(html)[1]
+
+    def anime_info(self, html: str, id: str) -> AnimeInfo:
+        page = ANIME.extract(html, self.profile)
+
+        synopsis = page["synopsis"]
+        poster = BASE_URL + "/" + (page["poster"] or "")
+
+        genres = [href.split("=")[1] for href in page["genres"] if href and "=" in href]
+
+        try:
+            AnimeThumbnailsId = page["anime_info"][0][0]
+            numbers = [episode for data in page["episodes"] for episode, _ in data]
+            episodes = EpisodeList(id, AnimeThumbnailsId, numbers)
+        except Exception as exc:
+            raise AnimeFLVParseError(exc)
+
+        return AnimeInfo(
+            id=id,
+            title=page["title"],
+            poster=poster,
+            banner=poster.replace("covers", "banners").strip(),
+            synopsis=synopsis.strip() if synopsis else None,
+            rating=page["rating"],
+            debut=page["debut"],
+            type=page["type"],
+            episodes=episodes,
+            genres=genres,
+        )
+
+    def links(
+        self, html: str, format: EpisodeFormat = EpisodeFormat.Subtitled
+    ) -> List[DownloadLinkInfo]:
+        return self.episode_page(html).get_links(format)
+
+    def video_servers(
+        self, html: str, format: EpisodeFormat = EpisodeFormat.Subtitled
+    ) -> List[Dict[str, str]]:
+        return self.episode_page(html).get_video_servers(format)
+
+    def episode_page(self, html: str) -> EpisodePage:
+        page = EPISODE.extract(html, self.profile)
+        return EpisodePage(
+            links=self._episode_links(page["links"]),
+            video_servers=self._episode_video_servers(page["videos"]),
+        )
+
+    def _home_page(self, html: str) -> Tuple[List[AnimeInfo], List[EpisodeInfo]]:
+        page = HOME.extract(html, self.profile)
+        episodes = []
+
+        for item in page["episodes"]:
+            try:
+                anime, _, id = item["href"].rpartition("-")
+
+                episodes.append(
+                    EpisodeInfo(
+                        id=id,
+                        anime=removeprefix(anime, "/ver/"),
+                        image_preview=f"{BASE_URL}{item['image']}",
+                    )
+                )
+            except Exception as exc:
+                raise AnimeFLVParseError(exc)
+
+        return self._anime_list(page["animes"]), episodes
+
+    def _episode_links(
+        self, rows: List[Dict[str, Any]]
+    ) -> List[Tuple[EpisodeFormat, DownloadLinkInfo]]:
+        try:
+            ret = []
+
+            for row in rows:
+                link_format = EPISODE_FORMATS.get(string(row["FORMATO"]))
+                if link_format is not None:
+                    ret.append(
+                        (
+                            link_format,
+                            DownloadLinkInfo(
+                                server=string(row["SERVIDOR"]),
+                                url=OUO_PREFIX.sub(
+                                    "", unquote(row["DESCARGAR"].find(".//a").attrib["href"])
+                                ),
+                            ),
+                        )
+                    )
+
+            return ret
+        except Exception as exc:
+            raise AnimeFLVParseError(exc)
+
+    def _episode_video_servers(
+        self, videos: List[Dict[str, Any]]
+    ) -> List[Tuple[EpisodeFormat, Dict[str, str]]]:
+        return [
+            (server_format, data[label])
+            for data in videos
+            for label, server_format in EPISODE_FORMATS.items()
+            if label in data
+        ]
+
+    def _page_count(self, pages: List[Optional[str]]) -> int:
+        return max((int(text) for text in pages if (text or "").isdigit()), default=1)
+
+    def _anime_list(self, items: List[Dict[str, Any]]) -> List[AnimeInfo]:
+        ret = []
+
+        for item in items:
+            try:
+                poster = item["poster"]
+                synopsis = item["synopsis"]
+                debut = item["debut"]
+
+                ret.append(
+                    AnimeInfo(
+                        id=removeprefix(item["href"][1:], "anime/"),
+                        title=item["title"],
+                        poster=poster,
+                        banner=poster.replace("covers", "banners").strip(),
+                        type=item["type"],
+                        synopsis=synopsis.strip() if synopsis else None,
+                        rating=item["rating"],
+                        debut=debut.lower() if debut is not None else None,
+                    )
+                )
+            except Exception as exc:
+                raise AnimeFLVParseError(exc)
+
+        return ret
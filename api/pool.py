@@ -0,0 +1,172 @@
+import threading
+import time
+
+import requests
+
+from cloudscraper.exceptions import CloudflareException
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional, Tuple
+from .animeflv import AnimeFLV
+from .exception import AnimeFLVPoolTimeout
+
+
+class AnimeFLVPool(object):
+    """
+    Pool of long-lived `AnimeFLV` clients.
+
+    Creating a client builds a new cloudscraper session, which means new TCP/TLS
+    connections and solving the Cloudflare challenge again. The pool keeps up to
+    `max_size` clients alive and hands them out one caller at a time, so that work is
+    amortized across requests.
+
+    :param max_size: maximum amount of clients, idle or checked out.
+    :param idle_timeout: seconds an idle client is kept before being closed.
+    :param health_check: called before handing out an idle client, outside of the pool
+        lock. If it returns False the client is closed and another one is used.
+    :param timeout: seconds `checkout` waits for a free client, None waits forever.
+    :param **kwargs: arguments used to create every `AnimeFLV`.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 16,
+        idle_timeout: float = 300,
+        health_check: Optional[Callable[[AnimeFLV], bool]] = None,
+        timeout: Optional[float] = 30,
+        **kwargs,
+    ):
+        self._max_size = max_size
+        self._idle_timeout = idle_timeout
+        self._health_check = health_check
+        self._timeout = timeout
+        self._kwargs = kwargs
+        self._idle: List[Tuple[AnimeFLV, float]] = []
+        self._size = 0
+        self._closed = False
+        self._condition = threading.Condition()
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def idle(self) -> int:
+        return len(self._idle)
+
+    def checkout(self) -> AnimeFLV:
+        """
+        Take a client out of the pool, creating one if none is idle and the pool is not
+        full. It must be given back with `checkin`.
+
+        :rtype: AnimeFLV
+        """
+        deadline = None if self._timeout is None else time.monotonic() + self._timeout
+
+        while True:
+            api = self._take(deadline)
+            if api is None:
+                break
+            # Checked outside of the lock, a health check may go to the network
+            if self._health_check is None or self._healthy(api):
+                return api
+            self.checkin(api, discard=True)
+
+        # Created outside of the lock, building a scraper is not free
+        try:
+            return AnimeFLV(**self._kwargs)
+        except BaseException:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+
+    def checkin(self, api: AnimeFLV, discard: bool = False) -> None:
+        """
+        Give back a client taken with `checkout`.
+
+        :param api: the client.
+        :param discard: close the client instead of keeping it, e.g. after an error.
+        """
+        with self._condition:
+            if discard or self._closed:
+                self._close(api)
+            else:
+                self._idle.append((api, time.monotonic()))
+            self._condition.notify()
+
+    @contextmanager
+    def session(self) -> Iterator[AnimeFLV]:
+        """
+        Checkout a client for the duration of the block. It is discarded if the block
+        raises a connection or Cloudflare error, other errors (like as a page that can't
+        be parsed or a 404) keep the client and its clearance.
+        """
+        api = self.checkout()
+        try:
+            yield api
+        except BaseException as exc:
+            self.checkin(api, discard=_broken(exc))
+            raise
+        else:
+            self.checkin(api)
+
+    def close(self) -> None:
+        with self._condition:
+            self._closed = True
+            while self._idle:
+                self._close(self._idle.pop()[0])
+            self._condition.notify_all()
+
+    def _take(self, deadline: Optional[float]) -> Optional[AnimeFLV]:
+        # An idle client, or None once a slot for a new one is reserved
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise RuntimeError("The pool is closed")
+
+                self._expire()
+
+                if self._idle:
+                    return self._idle.pop()[0]
+
+                if self._size < self._max_size:
+                    self._size += 1
+                    return None
+
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise AnimeFLVPoolTimeout(
+                        f"No client available after {self._timeout} seconds"
+                    )
+                self._condition.wait(remaining)
+
+    def _expire(self) -> None:
+        # Idle clients are appended on checkin, the oldest are at the start
+        now = time.monotonic()
+        while self._idle and now - self._idle[0][1] > self._idle_timeout:
+            self._close(self._idle.pop(0)[0])
+
+    def _healthy(self, api: AnimeFLV) -> bool:
+        try:
+            return self._health_check(api)
+        except Exception:
+            return False
+
+    def _close(self, api: AnimeFLV) -> None:
+        self._size -= 1
+        try:
+            api.close()
+        except Exception:
+            pass
+
+
+def _broken(exc: BaseException) -> bool:
+    """
+    Whether an error leaves the client unusable: its connections failed or its Cloudflare
+    clearance was refused.
+    """
+    if isinstance(exc, (requests.ConnectionError, requests.Timeout, CloudflareException)):
+        return True
+    if isinstance(exc, requests.HTTPError) and exc.response is not None:
+        return exc.response.status_code in (403, 503)
+    return False
@@ -0,0 +1,228 @@
+"""Offline benchmarks of the scraping and rendering hot paths.
+
+The pages in `benchmarks/fixtures` are served by a local stub server, so the numbers
+only depend on this machine and the code under test. Results are written as JSON to be
+compared between versions:
+
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --filter lxml --repeat 20
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable
+
+import flask
+from bs4 import BeautifulSoup
+from mesop.runtime import runtime
+
+from api.animeflv import BASE_URL, AnimeFLV, EpisodeFormat, EpisodeInfoDownload, get_parser
+from api.extract import Profile
+from api.lxml_parser import LxmlParser
+from benchmarks.server import StubAdapter, StubServer, load_fixture
+from components.grid_table import (
+    GridTableColumn,
+    GridTablePagination,
+    GridTableRow,
+    deserialize_dataframe,
+    download_component,
+    grid_table,
+    image_component,
+    serialize_dataframe,
+    text_component,
+    text_component_bold,
+)
+from utils.front import convert_to_dataframe_1, convert_to_dataframe_2
+
+PARSERS = ("bs4", "lxml")
+
+
+def measure(fn: Callable, repeat: int, number: int) -> dict:
+    """Runs `fn` `number` times per round for `repeat` rounds, after one warm-up call."""
+    fn()
+    rounds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        rounds.append((time.perf_counter() - start) / number)
+
+    return {
+        "repeat": repeat,
+        "number": number,
+        "min_ms": min(rounds) * 1000,
+        "median_ms": statistics.median(rounds) * 1000,
+        "mean_ms": statistics.mean(rounds) * 1000,
+        "stdev_ms": statistics.stdev(rounds) * 1000 if len(rounds) > 1 else 0.0,
+    }
+
+
+def render(component: Callable) -> int:
+    """Renders `component` in a fresh Mesop context, returns the payload size in bytes."""
+    with flask.Flask(__name__).app_context():
+        component()
+        return len(runtime().context().current_node().SerializeToString())
+
+
+def client(server: StubServer, parser: str) -> AnimeFLV:
+    api = AnimeFLV(parser=parser)
+    api._scraper.mount(BASE_URL, StubAdapter(BASE_URL, server.url))
+    return api
+
+
+def cases(server: StubServer) -> dict[str, Callable]:
+    browse, anime, episode = (
+        load_fixture(name).decode() for name in ("browse.html", "anime.html", "episode.html")
+    )
+    ret = {}
+
+    for parser in PARSERS:
+        api = client(server, parser)
+        ret[f"search[{parser}]"] = lambda api=api: api.search("taizai")
+        ret[f"get_anime_info[{parser}]"] = lambda api=api: api.get_anime_info("nanatsu-no-taizai")
+        ret[f"get_links[{parser}]"] = lambda api=api: api.get_links("nanatsu-no-taizai-1")
+        ret[f"get_episode_page[{parser}]"] = lambda api=api: api.get_episode_page("nanatsu-no-taizai-1")
+        ret[f"get_latest_animes[{parser}]"] = lambda api=api: api.get_latest_animes()
+
+        parse = get_parser(parser)
+        ret[f"parse_search[{parser}]"] = lambda parse=parse: parse.search(browse)
+        ret[f"parse_anime_info[{parser}]"] = lambda parse=parse: parse.anime_info(anime, "nanatsu-no-taizai")
+        ret[f"parse_links[{parser}]"] = lambda parse=parse: parse.links(episode)
+
+    soup_api = client(server, "bs4")
+    elements = BeautifulSoup(browse, "lxml").select("div.Container ul.ListAnimes li article")
+    ret["_process_anime_list_info"] = lambda: soup_api._process_anime_list_info(elements)
+
+    animes = get_parser("lxml").search(browse) * 10
+    info = get_parser("lxml").anime_info(anime, "nanatsu-no-taizai")
+    links = get_parser("lxml").links(episode, EpisodeFormat.Subtitled | EpisodeFormat.Dubbed)
+    downloads = [
+        EpisodeInfoDownload(id=e.id, anime=e.anime, image_preview=e.image_preview, downloads=links)
+        for e in info.episodes
+    ]
+    animes_df = convert_to_dataframe_1(animes)
+    downloads_df = convert_to_dataframe_2(downloads)
+    animes_json = serialize_dataframe(animes_df)
+
+    ret["convert_to_dataframe_1"] = lambda: convert_to_dataframe_1(animes)
+    ret["convert_to_dataframe_2"] = lambda: convert_to_dataframe_2(downloads)
+    ret["serialize_dataframe"] = lambda: serialize_dataframe(animes_df)
+    ret["deserialize_dataframe"] = lambda: deserialize_dataframe(animes_json)
+
+    animes_row = GridTableRow(
+        columns={
+            "Poster": GridTableColumn(component=image_component),
+            "Título": GridTableColumn(component=text_component_bold, sortable=True),
+            "Sinopsis": GridTableColumn(component=text_component),
+            "Nombre": GridTableColumn(component=text_component_bold, sortable=True),
+        }
+    )
+    downloads_row = GridTableRow(
+        columns={
+            "Episodio": GridTableColumn(component=text_component_bold),
+            "Descargas": GridTableColumn(component=download_component),
+        }
+    )
+    ret["grid_table[animes]"] = lambda: render(lambda: grid_table(animes_df, row_config=animes_row))
+    ret["grid_table[animes, page of 20]"] = lambda: render(
+        lambda: grid_table(animes_df, row_config=animes_row, pagination=GridTablePagination(page_size=20))
+    )
+    ret["grid_table[episodes]"] = lambda: render(lambda: grid_table(downloads_df, row_config=downloads_row))
+
+    return ret
+
+
+def parser_parity() -> bool:
+    """Whether every parser backend gives the same models for the fixtures."""
+    browse, anime, episode, home = (
+        load_fixture(name).decode()
+        for name in ("browse.html", "anime.html", "episode.html", "home.html")
+    )
+    both = EpisodeFormat.Subtitled | EpisodeFormat.Dubbed
+    outputs = [
+        (
+            parse.search(browse),
+            parse.page_count(browse),
+            parse.browse_page(browse),
+            parse.anime_info(anime, "nanatsu-no-taizai"),
+            parse.links(episode, both),
+            parse.video_servers(episode, both),
+            parse.episode_page(episode),
+            parse.latest_animes(home),
+            parse.latest_episodes(home),
+        )
+        for parse in map(get_parser, PARSERS)
+    ]
+    return all(output == outputs[0] for output in outputs[1:])
+
+
+def extraction_profile() -> dict:
+    """Time spent on every field of the extraction specs parsing the fixtures once."""
+    browse, anime, episode, home = (
+        load_fixture(name).decode()
+        for name in ("browse.html", "anime.html", "episode.html", "home.html")
+    )
+    profile = Profile()
+    parse = LxmlParser(profile)
+
+    # A single pass over every page type
+    parse.browse_page(browse)
+    parse.anime_info(anime, "nanatsu-no-taizai")
+    parse.episode_page(episode)
+    parse.latest_animes(home)
+
+    return {key: {"calls": calls, "ms": seconds * 1000} for key, calls, seconds in profile.report()}
+
+
+def revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv: list[str] | None = None) -> int:
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--output", "-o", help="Write the JSON results to this file instead of stdout")
+    arg_parser.add_argument("--repeat", type=int, default=10, help="Timed rounds per benchmark")
+    arg_parser.add_argument("--number", type=int, default=5, help="Calls per round")
+    arg_parser.add_argument("--filter", "-k", default="", help="Only run benchmarks containing this text")
+    args = arg_parser.parse_args(argv)
+
+    with StubServer() as server:
+        results = {}
+        for name, fn in cases(server).items():
+            if args.filter in name:
+                results[name] = measure(fn, args.repeat, args.number)
+                if name.startswith("grid_table"):
+                    results[name]["payload_bytes"] = fn()
+                print(f"{name:40} {results[name]['median_ms']:10.3f} ms", file=sys.stderr)
+
+    report = {
+        "revision": revision(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parser_parity": parser_parity(),
+        "extraction_profile": extraction_profile(),
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+    return 0 if report["parser_parity"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from requests.adapters import HTTPAdapter
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+# First matching path prefix wins, the homepage is the fallback
+ROUTES = (
+    ("/browse", "browse.html"),
+    ("/anime/", "anime.html"),
+    ("/ver/", "episode.html"),
+    ("/", "home.html"),
+)
+
+
+def load_fixture(name: str) -> bytes:
+    with open(os.path.join(FIXTURES_DIR, name), "rb") as f:
+        return f.read()
+
+
+class _FixtureHandler(BaseHTTPRequestHandler):
+    pages: dict[str, bytes] = {}
+
+    def do_GET(self):
+        for prefix, name in ROUTES:
+            if self.path.startswith(prefix):
+                body = self.pages[name]
+                break
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer:
+    """Local HTTP server answering animeflv.net paths with the saved fixtures."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        _FixtureHandler.pages = {name: load_fixture(name) for _, name in ROUTES}
+        self._server = ThreadingHTTPServer((host, port), _FixtureHandler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> "StubServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class StubAdapter(HTTPAdapter):
+    """Transport adapter sending the requests for `origin` to the stub server instead.
+
+    Mounted on the scraper of an `AnimeFLV`, so the client code runs unchanged.
+    """
+
+    def __init__(self, origin: str, target: str):
+        super().__init__()
+        self.origin = origin
+        self.target = target
+
+    def send(self, request, **kwargs):
+        request.url = self.target + request.url[len(self.origin):]
+        return super().send(request, **kwargs)
@@ -10,16 +10,18 @@ Functionality:
 - Row click
 - Expandable rows
 - Sticky header
+- Pagination
 - Filtering (technically not built-in to the grid table component)
 
 TODOs:
 
-- Pagination
 - Sticky column
 - Control column width
 - Column filtering within grid table
 """
 
+import math
+import threading
 from dataclasses import dataclass, field
 from datetime import datetime
 from io import StringIO
@@ -29,12 +31,24 @@ import pandas as pd
 
 import mesop as me
 
-from api.animeflv import AnimeInfo, DownloadLinkInfo
-from utils.api_requests import get_anime_episode_info_download
-from utils.front import convert_to_dataframe_2
+from api.animeflv import AnimeInfo, DownloadLinkInfo, EpisodeInfo, EpisodeInfoDownload
+from utils.api_requests import feed, get_anime_episodes, get_episode_links, mirrors, prefetch_request, \
+    resolve_episode_downloads, search_animes
+from utils.change_feed import FeedChanges
+from utils.front import convert_to_dataframe_1, convert_to_dataframe_2
+from utils.image_proxy import proxy_url
+from utils.prefetch import Prefetcher
+from utils.table_store import TableStore
 
 SortDirection = Literal["asc", "desc"]
 
+# Episodes whose download links are resolved at once in the expanded anime
+EPISODES_PAGE_SIZE = 25
+
+# Top search results whose anime page and first episode pages are loaded before they are expanded
+PREFETCH_RESULTS = 3
+PREFETCH_EPISODES = 3
+
 
 def serialize_dataframe(df: pd.DataFrame) -> str:
     return df.to_json(orient="split")
@@ -45,23 +59,85 @@ def deserialize_dataframe(json_str: str) -> pd.DataFrame:
     return pd.read_json(json_io, orient="split")
 
 
+# Tables and fetched data live here, the state only keeps the key to find them
+tables = TableStore()
+
+EMPTY_TABLE = pd.DataFrame(
+    data={
+        "Poster": [],
+        "Título": [],
+        "Sinopsis": [],
+        "Nombre": []
+    }
+)
+
+
+def _on_feed_changes(changes: FeedChanges):
+    """Drops the episode lists of the animes with new episodes."""
+    for anime in changes.changed_animes:
+        tables.invalidate(("episodes", anime))
+
+
+feed.listeners.append(_on_feed_changes)
+
+
+def load_episodes(anime: str) -> List[EpisodeInfo]:
+    return tables.get(("episodes", anime), lambda: get_anime_episodes(anime))
+
+
+def downloads_key(anime: str, episodes: List[EpisodeInfo]) -> tuple:
+    return "downloads", anime, tuple(e.id for e in episodes)
+
+
+def downloads_table(resolved: List[EpisodeInfoDownload]) -> pd.DataFrame:
+    # Measured in the background, `download_component` ranks the links once it's done
+    mirrors.refresh(link.url for e in resolved for link in e.downloads)
+    return convert_to_dataframe_2(resolved)
+
+
+def prefetch_anime(anime: str, cancel: threading.Event):
+    """Loads the episodes of an anime and the links of its first `PREFETCH_EPISODES`
+    episodes, so its expander opens from the response cache.
+
+    Requests go through `prefetch_request`, failing them never opens the circuit of the
+    requests of the users.
+    """
+    episodes = tables.get(("episodes", anime), lambda: get_anime_episodes(anime, call=prefetch_request))
+
+    for e in episodes[:PREFETCH_EPISODES]:
+        if cancel.is_set():
+            return
+        get_episode_links(anime, e.id, call=prefetch_request)
+
+
+# Warms the top results of every search, a new search of the same session cancels it
+prefetcher = Prefetcher(prefetch_anime, max_workers=2)
+
+
+def get_table(table_key: str) -> pd.DataFrame:
+    """Search results table of `table_key`, the query that produced it.
+
+    The table is rebuilt from a new search if it's not in `tables`.
+    """
+    if not table_key:
+        return EMPTY_TABLE
+    return tables.get(("search", table_key), lambda: convert_to_dataframe_1(search_animes(table_key)))
+
+
 @me.stateclass
 class State:
-    expanded_df_row_index: int | None = None
+    # Id of the expanded anime, not its row: the table may be rebuilt in another order
+    expanded_anime: str
+    page_index: int = 0
+    episode_page: int = 0
     sort_column: str
     sort_direction: SortDirection = "asc"
     string_output: str
     table_filter: str
     serie: str
     theme: str = "light"
-    df: str = serialize_dataframe(pd.DataFrame(
-        data={
-            "Poster": [],
-            "Título": [],
-            "Sinopsis": [],
-            "Nombre": []
-        }
-    ))
+    table_key: str
+    prefetch_batch: str
 
 
 @dataclass(kw_only=True)
@@ -130,6 +206,24 @@ class GridTableRow:
     style: Callable | None = None
 
 
+@dataclass(kw_only=True)
+class GridTablePagination:
+    """Configuration for table pagination
+
+    Only the rows of the current page are rendered.
+
+    Attributes:
+
+      page_size: Rows per page
+      page_index: Current page, starting at 0. Clamped to the last page.
+      on_change: Click event of the page buttons. The event key is the new page index.
+    """
+
+    page_size: int = 20
+    page_index: int = 0
+    on_change: Callable | None = None
+
+
 @dataclass(kw_only=True)
 class GridTableCellMeta:
     """Metadata that is passed into style/component/expander callables.
@@ -269,18 +363,29 @@ class GridTableThemeLight(GridTableTheme):
 def get_data_frame():
     """Helper function to get a sorted/filtered version of the main data frame.
 
-    One drawback of this approach is that we sort/filter the main data frame with every
-    refresh, which may not be efficient for larger data frames.
+    The result is kept in `tables` for each sort/filter combination, so refreshes don't
+    sort/filter the main data frame again.
     """
     state = me.state(State)
+    df = get_table(state.table_key)
+    key = ("view", state.table_key, state.sort_column, state.sort_direction, state.table_filter)
+
+    # Views are stored with the table they come from, a new search replaces the table
+    source, view = tables.get(key, lambda: (df, _sort_and_filter(df, state)))
+    if source is not df:
+        view = _sort_and_filter(df, state)
+        tables.put(key, (df, view))
+    return view
 
+
+def _sort_and_filter(df: pd.DataFrame, state: State) -> pd.DataFrame:
     # Sort the data frame if sorting is enabled.
     if state.sort_column:
-        sorted_df = deserialize_dataframe(state.df).sort_values(
+        sorted_df = df.sort_values(
             by=state.sort_column, ascending=state.sort_direction == "asc"
         )
     else:
-        sorted_df = deserialize_dataframe(state.df)
+        sorted_df = df
 
     # Simple filtering by the Strings column.
     if state.table_filter:
@@ -307,10 +412,22 @@ def on_table_cell_click(e: me.ClickEvent):
     """If the table cell is clicked, show the expanded content."""
     state = me.state(State)
     df_row_index, _ = map(int, e.key.split("-"))
-    if state.expanded_df_row_index == df_row_index:
-        state.expanded_df_row_index = None
+    anime = get_table(state.table_key)["Nombre"].get(df_row_index)
+    if anime is None or state.expanded_anime == anime:
+        state.expanded_anime = ""
     else:
-        state.expanded_df_row_index = df_row_index
+        state.expanded_anime = anime
+    state.episode_page = 0
+
+
+def expanded_df_row_index() -> int | None:
+    """Row of the expanded anime in the current table, None if it's not there anymore."""
+    state = me.state(State)
+    if not state.expanded_anime:
+        return None
+    df = get_table(state.table_key)
+    rows = df.index[df["Nombre"] == state.expanded_anime]
+    return int(rows[0]) if len(rows) else None
 
 
 def on_table_sort(e: me.ClickEvent):
@@ -322,6 +439,13 @@ def on_table_sort(e: me.ClickEvent):
     else:
         state.sort_direction = direction  # type: ignore
     state.sort_column = column
+    state.page_index = 0
+
+
+def on_table_page_change(e: me.ClickEvent):
+    """Handles the page buttons of the main table."""
+    state = me.state(State)
+    state.page_index = int(e.key)
 
 
 def expander(df_row_index: int):
@@ -337,7 +461,8 @@ def expander(df_row_index: int):
     """
     state = me.state(State)
 
-    columns = list(deserialize_dataframe(state.df).columns)
+    df = get_table(state.table_key)
+    columns = list(df.columns)
     with me.box(style=me.Style(padding=me.Padding.all(15))):
         me.text(f"Expanded row: {df_row_index}", type="headline-5")
         with me.box(
@@ -347,7 +472,7 @@ def expander(df_row_index: int):
                     gap=10,
                 )
         ):
-            for index, col in enumerate(deserialize_dataframe(state.df).iloc[df_row_index]):
+            for index, col in enumerate(df.iloc[df_row_index]):
                 me.input(
                     label=columns[index], value=str(col), style=me.Style(width="100%")
                 )
@@ -390,16 +515,41 @@ def bool_component(meta: GridTableCellMeta):
         me.icon("cancel", style=me.Style(color="red"))
 
 
+def on_episode_page_change(e: me.ClickEvent):
+    state = me.state(State)
+    state.episode_page = int(e.key)
+
+
 def anime_info_component(meta: GridTableCellMeta):
+    """Episodes of the expanded anime.
+
+    Only the episode list is fetched up front, download links are resolved for the
+    `EPISODES_PAGE_SIZE` episodes of the current page.
+    """
     state = me.state(State)
-    anime = deserialize_dataframe(state.df)['Nombre'].get(meta)
+    anime = state.expanded_anime
+
+    episodes = load_episodes(anime)
+    pages = max(1, math.ceil(len(episodes) / EPISODES_PAGE_SIZE))
+    page = min(state.episode_page, pages - 1)
+    start = page * EPISODES_PAGE_SIZE
+    visible = episodes[start:start + EPISODES_PAGE_SIZE]
 
-    dataf = convert_to_dataframe_2(get_anime_episode_info_download(anime))
+    dataf = tables.get(downloads_key(anime, visible), lambda: downloads_table(resolve_episode_downloads(visible)))
+    # Stats expire before the table, measure the hosts again without waiting for them
+    mirrors.refresh(link.url for links in dataf["Descargas"] for link in links)
 
     with me.box(style=me.Style(margin=me.Margin.all(10), border=me.Border.all(
           me.BorderSide(width=3, color="#5474B4", style='groove')
         ),
         border_radius=10,)):
+        grid_table_pager(
+            page_index=page,
+            page_count=pages,
+            label=f"Episodios {start + 1}-{start + len(visible)} de {len(episodes)}",
+            on_change=on_episode_page_change,
+        )
+
         grid_table(
             dataf,
             on_sort=on_table_sort,
@@ -420,10 +570,18 @@ def anime_info_component(meta: GridTableCellMeta):
 
 
 def download_component(meta: GridTableCellMeta):
+    """Download links of an episode, the fastest healthy mirror first.
+
+    Links whose host didn't answer are greyed out.
+    """
     data: List[DownloadLinkInfo] = meta.value
 
     with me.box(style=me.Style(display="flex", flex_wrap="wrap", gap=5)):
-        for x in data:
+        for i, (x, stats) in enumerate(mirrors.rank(data)):
+            text = x.server
+            if stats is not None and stats.healthy:
+                text = f"{'⚡ ' if i == 0 else ''}{x.server} · {stats.latency * 1000:.0f} ms"
+
             match x.server:
                 case "MEGA":
                     color = "#FE1B19"
@@ -435,9 +593,11 @@ def download_component(meta: GridTableCellMeta):
                     color = "#21328C"
                 case _:
                     color = "#F01879"
+            if stats is not None and not stats.healthy:
+                color = "#9E9E9E"
 
             me.link(
-                text=x.server,
+                text=text,
                 url=x.url,
                 open_in_new_tab=True,
                 style=me.Style(
@@ -490,7 +650,7 @@ def date_component(meta: GridTableCellMeta):
 def image_component(meta: GridTableCellMeta):
     """Example of a cell rendering using image."""
     me.image(
-        src=meta.value,
+        src=proxy_url(meta.value),
         alt='Anime Image',
         style=me.Style(
             cursor="pointer",
@@ -509,6 +669,7 @@ def grid_table(
         header_config: GridTableHeader | None = None,
         on_click: Callable | None = None,
         on_sort: Callable | None = None,
+        pagination: GridTablePagination | None = None,
         row_config: GridTableRow | None = None,
         sort_column: str = "",
         sort_direction: SortDirection = "asc",
@@ -523,11 +684,20 @@ def grid_table(
       header_config: Configuration for the table header
       on_click: Click event that fires when a cell is clicked
       on_sort: Click event that fires when a sortable header column is clicked
+      pagination: Configuration for pagination, all rows are rendered if not set
       row_config: Configuration for the tables's rows
       sort_column: Current sort column
       sort_direction: Current sort direction
       theme: Table theme
     """
+    row_offset = 0
+    row_count = len(data)
+    if pagination:
+        page_count = max(1, math.ceil(row_count / pagination.page_size))
+        page_index = min(max(pagination.page_index, 0), page_count - 1)
+        row_offset = page_index * pagination.page_size
+        data = data.iloc[row_offset:row_offset + pagination.page_size]
+
     with me.box(
             style=me.Style(
                 display="grid",
@@ -583,7 +753,7 @@ def grid_table(
                     me.text(col)
 
         # Render table rows
-        for row_index, row in enumerate(data.itertuples(name=None)):
+        for row_index, row in enumerate(data.itertuples(name=None), start=row_offset):
             for col_index, col in enumerate(row[1:]):
                 cell_config = row_config.columns.get(
                     col_index_name_map[col_index], GridTableColumn()
@@ -628,6 +798,61 @@ def grid_table(
                 ):
                     row_config.expander.component(row[0])
 
+    if pagination:
+        grid_table_pager(
+            page_index=page_index,
+            page_count=page_count,
+            label=f"{row_offset + 1}-{row_offset + len(data)} de {row_count}",
+            on_change=pagination.on_change,
+        )
+
+
+@me.component
+def grid_table_pager(
+        *,
+        page_index: int,
+        page_count: int,
+        label: str = "",
+        on_change: Callable | None = None,
+):
+    """Previous/next buttons of a paginated table.
+
+    Nothing is rendered when there is a single page.
+
+    Args:
+
+      page_index: Current page, starting at 0
+      page_count: Amount of pages
+      label: Text shown next to the buttons
+      on_change: Click event of the buttons. The event key is the new page index.
+    """
+    if page_count <= 1:
+        return
+
+    with me.box(
+            style=me.Style(
+                display="flex",
+                align_items="center",
+                justify_content="end",
+                gap=5,
+                margin=me.Margin.all(5),
+            )
+    ):
+        me.text(label, type="body-1")
+        me.button(
+            label="Anterior",
+            key=str(page_index - 1),
+            disabled=page_index == 0,
+            on_click=on_change,
+        )
+        me.text(f"{page_index + 1} / {page_count}", type="body-1")
+        me.button(
+            label="Siguiente",
+            key=str(page_index + 1),
+            disabled=page_index == page_count - 1,
+            on_click=on_change,
+        )
+
 
 def _make_header_style(
         *, theme: GridTableTheme, header_config: GridTableHeader, sortable: bool
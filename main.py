@@ -1,18 +1,42 @@
+import os
+import tempfile
+import uuid
+
 import mesop as me
 
 from components.grid_table import GridTableThemeLight, GridTableThemeDark, expander, GridTableExpander, \
     GridTableColumn, on_table_sort, \
     GridTableRow, on_table_cell_click, GridTableHeader, get_data_frame, grid_table, State, image_component, \
-    serialize_dataframe, text_component, text_component_bold, anime_info_component
-from utils.api_requests import search_animes
+    text_component, text_component_bold, anime_info_component, GridTablePagination, \
+    on_table_page_change, tables, prefetcher, PREFETCH_RESULTS, expanded_df_row_index
+from utils.api_requests import feed, search_animes_iter
 from utils.front import convert_to_dataframe_1
+from utils.image_proxy import ImageCache, ImageProxy
+
+feed.start()
+
+# Serve with `gunicorn main:app` to also serve posters resized and cached by the image proxy
+app = ImageProxy(
+    me.create_wsgi_app(),
+    ImageCache(os.environ.get("ANIMEFLV_IMAGE_CACHE", os.path.join(tempfile.gettempdir(), "animeflv-images"))),
+)
 
 
 def on_filter_by_series(e: me.ClickEvent | me.InputEnterEvent):
     state = me.state(State)
     if state.serie != '':
-        state.df = serialize_dataframe(convert_to_dataframe_1(search_animes(state.serie)))
-        get_data_frame()
+        state.page_index = 0
+        state.expanded_anime = ""
+        prefetcher.cancel(state.prefetch_batch)
+        # Show the first page of results while the next ones are requested
+        for animes in search_animes_iter(state.serie):
+            tables.put(("search", state.serie), convert_to_dataframe_1(animes))
+            state.table_key = state.serie
+            yield
+
+        # The top results are loaded while the user reads them, so expanding one is instant
+        state.prefetch_batch = uuid.uuid4().hex
+        prefetcher.submit(state.prefetch_batch, [str(anime.id) for anime in animes[:PREFETCH_RESULTS]])
 
 
 def on_type(e: me.InputBlurEvent | me.InputEnterEvent | me.InputEvent):
@@ -57,6 +81,11 @@ def home():
                 header_config=GridTableHeader(sticky=True),
                 on_click=on_table_cell_click,
                 on_sort=on_table_sort,
+                pagination=GridTablePagination(
+                    page_size=20,
+                    page_index=state.page_index,
+                    on_change=on_table_page_change,
+                ),
                 row_config=GridTableRow(
                     columns={
                         "Poster": GridTableColumn(component=image_component),
@@ -66,7 +95,7 @@ def home():
                     },
                     expander=GridTableExpander(
                         component=anime_info_component,
-                        df_row_index=state.expanded_df_row_index,
+                        df_row_index=expanded_df_row_index(),
                     ),
                 ),
                 sort_column=state.sort_column,
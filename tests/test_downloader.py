@@ -0,0 +1,168 @@
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from utils.downloader import DownloadCancelled, DownloadError, SegmentedDownloader
+
+CONTENT = os.urandom(256 << 10)
+
+_RANGE = re.compile(r"bytes=(\d+)-(\d*)")
+
+
+class _RangeHandler(BaseHTTPRequestHandler):
+    server: "RangeServer"
+
+    def do_GET(self):
+        server = self.server
+        match = _RANGE.match(self.headers.get("Range", ""))
+        with server.lock:
+            server.requests.append(self.headers.get("Range"))
+
+        if match is None or server.mode == "no-range":
+            return self._send(200, CONTENT, [])
+
+        start = int(match.group(1))
+        end = min(int(match.group(2) or len(CONTENT) - 1), len(CONTENT) - 1)
+        probe = self.headers["Range"] == "bytes=0-0"
+        body = CONTENT[start:end + 1]
+
+        if server.mode == "empty" and not probe:
+            body = b""
+        if server.mode == "wrong-start" and not probe:
+            # The right amount of bytes, from somewhere else
+            start += 1
+            body = CONTENT[start:end + 2]
+
+        self._send(206, body, [("Content-Range", f"bytes {start}-{end}/{len(CONTENT)}"), ("ETag", '"v1"')])
+
+    def _send(self, status: int, body: bytes, headers: list):
+        self.send_response(status)
+        self.send_header("Content-Type", "video/mp4")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+
+        try:
+            for start in range(0, len(body), 8 << 10):
+                self.wfile.write(body[start:start + (8 << 10)])
+                if self.server.delay:
+                    time.sleep(self.server.delay)
+        except OSError:
+            # The client went away, e.g. a cancelled download
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+class RangeServer(ThreadingHTTPServer):
+    """Local server of `CONTENT` honouring `Range`, or misbehaving as told by `mode`."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _RangeHandler)
+        self.mode = "range"
+        self.delay = 0.0
+        self.requests: list[str | None] = []
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/episode.mp4"
+
+
+@pytest.fixture
+def server():
+    server = RangeServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def downloader(**kwargs) -> SegmentedDownloader:
+    return SegmentedDownloader(
+        **{"segments": 4, "min_segment_size": 32 << 10, "chunk_size": 8 << 10, "timeout": 5, **kwargs}
+    )
+
+
+def read(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_download_in_segments(server, tmp_path):
+    path = str(tmp_path / "episode.mp4")
+
+    assert downloader().download(server.url, path) == path
+
+    assert read(path) == CONTENT
+    assert not os.path.exists(f"{path}.part") and not os.path.exists(f"{path}.part.json")
+    # The probe and one request per segment
+    assert len(server.requests) == 5
+
+
+def test_cancel_and_resume(server, tmp_path):
+    path = str(tmp_path / "episode.mp4")
+    cancel = threading.Event()
+    server.delay = 0.01
+
+    def on_progress(progress):
+        if progress.done >= len(CONTENT) // 2:
+            cancel.set()
+
+    with pytest.raises(DownloadCancelled):
+        downloader().download(server.url, path, on_progress=on_progress, cancel=cancel)
+
+    assert not os.path.exists(path) and os.path.exists(f"{path}.part.json")
+
+    server.delay = 0
+    server.requests.clear()
+    resumed = []
+    downloader().download(server.url, path, on_progress=lambda progress: resumed.append(progress.done))
+
+    assert read(path) == CONTENT
+    # Only the missing bytes were requested again
+    assert resumed[0] > len(CONTENT) // 2
+    starts = [int(_RANGE.match(header).group(1)) for header in server.requests[1:]]
+    assert starts and all(start % (64 << 10) for start in starts)
+
+
+def test_wrong_content_range_start(server, tmp_path):
+    path = str(tmp_path / "episode.mp4")
+    server.mode = "wrong-start"
+
+    with pytest.raises(DownloadError, match="answered the range"):
+        downloader().download(server.url, path)
+
+    assert not os.path.exists(path)
+
+
+def test_empty_responses_are_retried_a_bounded_amount_of_times(server, tmp_path):
+    path = str(tmp_path / "episode.mp4")
+    server.mode = "empty"
+
+    with pytest.raises(DownloadError, match="sent no data"):
+        downloader(segments=1, min_segment_size=len(CONTENT), attempts=3).download(server.url, path)
+
+    # The probe and every attempt of the single segment
+    assert len(server.requests) == 1 + 3
+
+
+def test_server_without_range_support(server, tmp_path):
+    path = str(tmp_path / "episode.mp4")
+    server.mode = "no-range"
+
+    downloader().download(server.url, path)
+
+    assert read(path) == CONTENT
+    assert len(server.requests) == 2
+    assert not os.path.exists(f"{path}.part.json")
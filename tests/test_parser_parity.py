@@ -0,0 +1,35 @@
+import pytest
+
+from api.animeflv import EpisodeFormat, SoupParser
+from api.lxml_parser import LxmlParser
+from benchmarks.server import load_fixture
+
+BOTH = EpisodeFormat.Subtitled | EpisodeFormat.Dubbed
+
+# Parser method and the arguments it's called with, the page is passed first
+CASES = {
+    "search": ("browse.html",),
+    "page_count": ("browse.html",),
+    "browse_page": ("browse.html",),
+    "anime_info": ("anime.html", "nanatsu-no-taizai"),
+    "links": ("episode.html", BOTH),
+    "links[SUB]": ("episode.html", EpisodeFormat.Subtitled),
+    "links[LAT]": ("episode.html", EpisodeFormat.Dubbed),
+    "video_servers": ("episode.html", BOTH),
+    "video_servers[SUB]": ("episode.html", EpisodeFormat.Subtitled),
+    "episode_page": ("episode.html",),
+    "latest_animes": ("home.html",),
+    "latest_episodes": ("home.html",),
+}
+
+
+@pytest.mark.parametrize("case", CASES)
+def test_lxml_parser_matches_soup_parser(case):
+    fixture, *args = CASES[case]
+    html = load_fixture(fixture).decode()
+    method = case.partition("[")[0]
+
+    expected = getattr(SoupParser(), method)(html, *args)
+
+    assert expected, f"{fixture} gives an empty {method}, the fixture doesn't exercise it"
+    assert getattr(LxmlParser(), method)(html, *args) == expected
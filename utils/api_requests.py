@@ -1,59 +1,271 @@
-import time
-from typing import Any, List
+import math
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, List
 
-from cloudscraper.exceptions import CloudflareChallengeError
+from api.animeflv import AnimeInfo, DownloadLinkInfo, EpisodeInfoDownload, EpisodeInfo, DEFAULT_CACHE_TTLS, SearchPage, \
+    merge_search_pages
+from api.cache import ResponseCache
+from api.catalog import AnimeCatalog
+from api.fuzzy import rank
+from api.pool import AnimeFLVPool
+from api.singleflight import SingleFlight
+from utils.change_feed import ChangeFeed
+from utils.mirrors import MirrorProber
+from utils.retry import CircuitBreaker, CircuitOpenError, RetryMetrics, RetryPolicy, call_with_retry
 
-from api.animeflv import AnimeInfo, AnimeFLV, EpisodeInfoDownload, EpisodeInfo, DownloadLinkInfo
+MAX_LINK_WORKERS = 8
 
+# Upstream searches stop walking result pages after this amount of animes
+SEARCH_MAX_RESULTS = 120
 
-def wrap_request(func, *args, count: int = 10, expected: Any):
+MAX_SEARCH_WORKERS = 6
+
+# Seconds between the homepage polls of the change feed
+FEED_INTERVAL = 5 * 60
+
+# Seconds the complete upstream results of a search answer it, and the searches extending it,
+# from the local catalog
+CATALOG_MAX_AGE = 24 * 60 * 60
+
+# Shared by every request of the process, set ANIMEFLV_CACHE_PATH to also keep responses on disk
+# and ANIMEFLV_CATALOG_PATH to keep the catalog of known animes
+cache = ResponseCache(DEFAULT_CACHE_TTLS, path=os.environ.get("ANIMEFLV_CACHE_PATH"))
+catalog = AnimeCatalog(os.environ.get("ANIMEFLV_CATALOG_PATH", ":memory:"))
+# Sessions expanding the same anime at once share its fetches
+flight = SingleFlight()
+pool = AnimeFLVPool(max_size=2 * MAX_LINK_WORKERS, cache=cache, catalog=catalog, flight=flight, parser="lxml")
+
+# Measures the hosts of the download links to show the fastest first
+mirrors = MirrorProber()
+
+DEFAULT_RETRY_POLICY = RetryPolicy()
+breaker = CircuitBreaker()
+retry_metrics = RetryMetrics()
+
+
+def wrap_request(func, *args, policy: RetryPolicy = DEFAULT_RETRY_POLICY):
     """
-    Wraps a request sent by the module to test if it works correctly, tries `count` times sleeps
-    5 seconds if an error is encountered.
+    Wraps a request sent by the module, retrying transient upstream errors with exponential
+    backoff and jitter within the deadline of `policy`.
 
-    If `CloudflareChallengeError` is encountered, the expected result will be returned
-    to make it possible for automated tests to pass
+    Every request of the process shares `breaker`, so when animeflv.net is down requests
+    fail fast with `CircuitOpenError` instead of each one waiting for its own retries.
+    Attempts and outcomes are counted in `retry_metrics`.
 
     :param *args: args to call the function with.
-    :param count: amount of tries
-    :param expected: example for a valid return, this is used when cloudscraper complains
+    :param policy: attempts, backoff and deadline of the retries.
     :rtype: Any
     """
-    notes = []
+    return call_with_retry(func, *args, policy=policy, breaker=breaker, metrics=retry_metrics)
 
-    for _ in range(count):
-        try:
-            res = func(*args)
-            if isinstance(res, list) and len(res) < 1:
-                raise ValueError()  # Raise ValueError to retry test when empty array is returned
-            return res
-        except CloudflareChallengeError:
-            return expected
-        except Exception as exc:
-            notes.append(exc)
-            time.sleep(5)
-    raise Exception(notes)
-
-
-def search_animes(search: str):
-    with AnimeFLV() as api:
-        data = wrap_request(api.search, search, expected=[AnimeInfo(0, "")])
+
+# Prefetching fails fast on its own breaker, its failures never reject the requests of the
+# users. It doesn't retry and doesn't start while `breaker` is not closed
+prefetch_breaker = CircuitBreaker()
+PREFETCH_RETRY_POLICY = RetryPolicy(attempts=1)
+
+
+def prefetch_request(func, *args):
+    """
+    Like `wrap_request`, for requests made ahead of the users, see `prefetch_breaker`.
+
+    :param *args: args to call the function with.
+    :rtype: Any
+    """
+    if breaker.state != "closed":
+        raise CircuitOpenError("Upstream is unavailable, not prefetching")
+    return call_with_retry(func, *args, policy=PREFETCH_RETRY_POLICY, breaker=prefetch_breaker, metrics=retry_metrics)
+
+
+# Invalidates what changed upstream, started by the app
+feed = ChangeFeed(pool, cache, interval=FEED_INTERVAL, call=wrap_request)
+
+
+def get_episode_links(anime: str, episode: int, call: Callable = wrap_request) -> List[DownloadLinkInfo]:
+    with pool.session() as api:
+        data: List[DownloadLinkInfo] = call(api.get_links, f'{anime}-{episode}')
     return data
 
+
+def search_animes(search: str, max_results: int = SEARCH_MAX_RESULTS) -> List[AnimeInfo]:
+    """
+    Searches animes in the local catalog when the same search, or a broader one, was fully
+    answered by animeflv.net in the last `CATALOG_MAX_AGE` seconds, otherwise asks
+    animeflv.net and records its complete results in the catalog. Results are ranked by
+    similarity with `search`.
+
+    Titles with typos are only looked up in the catalog when animeflv.net fails or finds
+    nothing, a similar title is never offered instead of the real results.
+
+    Upstream result pages are requested in parallel, see `search_all_pages`.
+    """
+    data = catalog.search(search, limit=max_results, max_age=CATALOG_MAX_AGE)
+    if data is not None:
+        return rank(search, data) if data else _similar_animes(search)
+
+    try:
+        data = search_all_pages(search, max_results=max_results)
+    except Exception:
+        data = _similar_animes(search)
+        if data:
+            return data
+        raise
+
+    if len(data) < max_results:
+        # Not cut by `max_results`, so these are every result of the search
+        catalog.add_search(search, data)
+    return rank(search, data) if data else _similar_animes(search)
+
+
+def search_all_pages(search: str, max_results: int = None, max_workers: int = MAX_SEARCH_WORKERS) -> List[AnimeInfo]:
+    """
+    Searches animeflv.net and returns the animes of every result page, in page order and
+    without repeated ids.
+
+    The first page gives the amount of pages, the rest are requested at the same time with
+    at most `max_workers` in flight, so the search takes about as long as the two slowest
+    pages instead of the sum of all of them.
+
+    :param search: Query information like: 'nanatsu no taizai'.
+    :param max_results: only request the pages needed for this amount of animes.
+    :param max_workers: maximum amount of concurrent requests.
+    :rtype: List[AnimeInfo]
+    """
+    def fetch(page: int) -> SearchPage:
+        with pool.session() as api:
+            return wrap_request(api.search_page, search, page)
+
+    first = fetch(1)
+    last = first.page_count
+    if max_results is not None and first.animes:
+        last = min(last, math.ceil(max_results / len(first.animes)))
+
+    pages = [first]
+    if last > 1:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, last - 1))) as executor:
+            pages.extend(executor.map(fetch, range(2, last + 1)))
+
+    return merge_search_pages(pages)[:max_results]
+
+
+def search_animes_iter(search: str, max_results: int = SEARCH_MAX_RESULTS) -> Iterator[List[AnimeInfo]]:
+    """
+    Like `search_animes`, but yields the ranked results found so far after every upstream
+    result page, so the first rows can be shown while the next page is requested. Pages are
+    only requested as the iterator is consumed, stop iterating to cancel the search.
+
+    :param search: Query information like: 'nanatsu no taizai'.
+    :param max_results: stop walking result pages after this amount of animes.
+    :rtype: Iterator[List[AnimeInfo]]
+    """
+    data = catalog.search(search, limit=max_results, max_age=CATALOG_MAX_AGE)
+    if data is not None:
+        yield rank(search, data) if data else _similar_animes(search)
+        return
+
+    data = []
+    page = 1
+    while True:
+        # Each page is retried on its own, a failure halfway keeps the pages already shown
+        try:
+            with pool.session() as api:
+                result = wrap_request(api.search_page, search, page)
+        except Exception:
+            similar = _similar_animes(search) if page == 1 else []
+            if not similar:
+                raise
+            yield similar
+            return
+
+        data.extend(result.animes[:max_results - len(data)])
+        complete = len(data) < max_results and (not result.animes or page >= result.page_count)
+        if complete:
+            catalog.add_search(search, data)
+
+        if page == 1 and not data:
+            yield _similar_animes(search)
+            return
+        yield rank(search, data)
+
+        if complete or len(data) >= max_results:
+            return
+        page += 1
+
+
+def _similar_animes(search: str) -> List[AnimeInfo]:
+    # Titles seen before tolerating typos, only when animeflv.net can't answer
+    return catalog.fuzzy_search(search, max_age=CATALOG_MAX_AGE)
+
+
 def latest_animes():
-    with AnimeFLV() as api:
-        data = wrap_request(api.get_latest_animes, expected=[AnimeInfo(0, "")])
+    with pool.session() as api:
+        data = wrap_request(api.get_latest_animes)
     return data
 
 
-def get_anime_episode_info_download(id: str) -> List[EpisodeInfoDownload]:
-    with AnimeFLV() as api:
-        data: List[EpisodeInfo] = wrap_request(api.get_anime_info, id, expected=[AnimeInfo(0, "")]).episodes
+def get_anime_episodes(id: str, call: Callable = wrap_request) -> List[EpisodeInfo]:
+    with pool.session() as api:
+        data: List[EpisodeInfo] = call(api.get_anime_info, id).episodes
+    return data
+
+
+def get_anime_episode_info_download(id: str, max_workers: int = MAX_LINK_WORKERS) -> List[EpisodeInfoDownload]:
+    return resolve_episode_downloads(get_anime_episodes(id), max_workers=max_workers)
+
+
+def iter_anime_episode_info_download(id: str, max_workers: int = MAX_LINK_WORKERS) -> Iterator[EpisodeInfoDownload]:
+    return iter_episode_downloads(get_anime_episodes(id), max_workers=max_workers)
+
+
+def resolve_episode_downloads(episodes: List[EpisodeInfo], max_workers: int = MAX_LINK_WORKERS) -> List[EpisodeInfoDownload]:
+    """
+    Resolves the download links of every episode with at most `max_workers` episode pages
+    in flight at the same time.
 
-        r: List[EpisodeInfoDownload] = []
+    The result keeps the order of `episodes`. An episode whose links can't be resolved is
+    returned with empty `downloads` and the failure in `error`, the rest of the batch is not
+    affected.
+
+    :param episodes: episodes to resolve.
+    :param max_workers: maximum amount of concurrent requests.
+    :rtype: List[EpisodeInfoDownload]
+    """
+    return list(iter_episode_downloads(episodes, max_workers=max_workers))
+
+
+def iter_episode_downloads(episodes: Iterable[EpisodeInfo], max_workers: int = MAX_LINK_WORKERS) -> Iterator[EpisodeInfoDownload]:
+    """
+    Like `resolve_episode_downloads`, but yields every episode as soon as it and the ones
+    before it are resolved. Only a window of `2 * max_workers` episodes is resolved ahead of
+    the consumer, so long series are neither waited for nor held in memory, and closing the
+    iterator drops the episodes not started yet.
+
+    :param episodes: episodes to resolve.
+    :param max_workers: maximum amount of concurrent requests.
+    :rtype: Iterator[EpisodeInfoDownload]
+    """
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        pending = deque()
+        try:
+            for e in episodes:
+                pending.append(executor.submit(_resolve_episode_download, e))
+                if len(pending) >= 2 * max_workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
 
-        for e in data:
-            download = wrap_request(api.get_links, f'{e.anime}-{e.id}', expected=[List[DownloadLinkInfo('', '')]])
-            r.append(EpisodeInfoDownload(id=e.id, anime=e.anime, image_preview=e.image_preview, downloads=download))
-    return r
 
+def _resolve_episode_download(e: EpisodeInfo) -> EpisodeInfoDownload:
+    # cloudscraper sessions are not safe to share between threads, each task checks out its own
+    try:
+        with pool.session() as api:
+            download = wrap_request(api.get_links, f'{e.anime}-{e.id}')
+    except Exception as exc:
+        return EpisodeInfoDownload(id=e.id, anime=e.anime, image_preview=e.image_preview, downloads=[],
+                                   error=str(exc))
+    return EpisodeInfoDownload(id=e.id, anime=e.anime, image_preview=e.image_preview, downloads=download)
@@ -0,0 +1,119 @@
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Callable
+
+from api.animeflv import BASE_URL, AnimeInfo, EpisodeInfo, anime_url
+from api.cache import ResponseCache
+from api.pool import AnimeFLVPool
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(kw_only=True)
+class FeedChanges:
+    """What appeared on the homepage since the previous poll.
+
+    Attributes:
+
+      episodes: Episodes released since the previous poll
+      animes: Animes added since the previous poll
+    """
+
+    episodes: list[EpisodeInfo]
+    animes: list[AnimeInfo]
+
+    @property
+    def changed_animes(self) -> set[str]:
+        """Ids of the animes with a new episode or newly added."""
+        return {str(e.anime) for e in self.episodes} | {str(a.id) for a in self.animes}
+
+
+class ChangeFeed:
+    """Keeps cached data fresh from the homepage alone.
+
+    Every `interval` seconds the homepage is fetched once (the latest episodes and the
+    latest animes come from the same page) and compared with the previous poll. Only the
+    cached anime pages of the animes that changed are invalidated, and `listeners` are
+    called with the changes so other caches can do the same. New animes reach the catalog
+    through the pool clients.
+    """
+
+    def __init__(
+            self,
+            pool: AnimeFLVPool,
+            cache: ResponseCache,
+            *,
+            interval: float = 300,
+            call: Callable = lambda func, *args: func(*args),
+    ):
+        """
+        Args:
+
+          pool: Clients used to fetch the homepage
+          cache: Response cache to invalidate
+          interval: Seconds between polls
+          call: Calls the client methods, e.g. to retry them
+        """
+        self.pool = pool
+        self.cache = cache
+        self.interval = interval
+        self.call = call
+        self.listeners: list[Callable[[FeedChanges], None]] = []
+        self._episodes: set[tuple[str, str]] = set()
+        self._animes: set[str] = set()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def poll(self) -> FeedChanges:
+        """Fetches the homepage once and applies the changes since the previous poll.
+
+        Everything on the homepage counts as changed on the first poll, since pages may have
+        been cached before the feed started.
+        """
+        self.cache.invalidate(BASE_URL)
+        with self.pool.session() as api:
+            episodes = self.call(api.get_latest_episodes)
+            # Same page, answered by the cache
+            animes = self.call(api.get_latest_animes)
+
+        changes = FeedChanges(
+            episodes=[e for e in episodes if (str(e.anime), str(e.id)) not in self._episodes],
+            animes=[a for a in animes if str(a.id) not in self._animes],
+        )
+        self._episodes = {(str(e.anime), str(e.id)) for e in episodes}
+        self._animes = {str(a.id) for a in animes}
+
+        for anime in changes.changed_animes:
+            self.cache.invalidate(anime_url(anime))
+
+        for listener in self.listeners:
+            try:
+                listener(changes)
+            except Exception:
+                logger.exception("Change feed listener failed")
+
+        return changes
+
+    def start(self):
+        """Polls in a daemon thread until `stop`. Does nothing if it's already running."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="change-feed", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("Change feed poll failed")
+            self._stop.wait(self.interval)
@@ -0,0 +1,611 @@
+"""Download whole animes from the command line, resuming where a previous run stopped.
+
+Only direct links to files can be downloaded, links to the pages of file hosts (MEGA,
+1Fichier, ...) are skipped for the next server, and episodes without any direct link fail:
+
+    python -m utils.download_queue nanatsu-no-taizai --first 1 --last 12 --server MEGA
+    python -m utils.download_queue --queue downloads/queue.db    # resume the queued jobs
+"""
+
+import argparse
+import logging
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass
+from typing import Callable, List
+from urllib.parse import urlparse
+
+from api.animeflv import DownloadLinkInfo
+from utils.downloader import DownloadCancelled, NotDirectLinkError, SegmentedDownloader
+from utils.retry import RetryPolicy
+
+logger = logging.getLogger(__name__)
+
+# Concurrent downloads per file host, matched by domain suffix. Free plans of most hosts
+# only allow one or two downloads at a time per IP.
+DEFAULT_HOST_LIMITS = {
+    "mega.nz": 1,
+    "1fichier.com": 1,
+    "streamtape.com": 2,
+    "zippyshare.com": 2,
+}
+
+
+@dataclass(kw_only=True)
+class JobStatus:
+    """Progress of a job, as shown in the UI.
+
+    Attributes:
+
+      id: Job id returned by `DownloadQueue.add`
+      anime: Anime id, like as 'nanatsu-no-taizai'
+      first_episode: First episode of the range
+      last_episode: Last episode of the range, inclusive
+      server: Preferred server, None for any
+      priority: Higher runs first
+      episodes: Amount of episodes by state (queued, resolving, running, done, failed, cancelled)
+      done_bytes: Bytes downloaded so far
+      total_bytes: Size of the episodes whose size is known
+      errors: Last error of every failed episode
+    """
+
+    id: int
+    anime: str
+    first_episode: int
+    last_episode: int
+    server: str | None
+    priority: int
+    episodes: dict[str, int]
+    done_bytes: int
+    total_bytes: int
+    errors: list[str]
+
+    @property
+    def state(self) -> str:
+        if self.episodes.get("running") or self.episodes.get("resolving"):
+            return "running"
+        if self.episodes.get("queued"):
+            return "queued"
+        if self.episodes.get("failed"):
+            return "failed"
+        if self.episodes.get("cancelled"):
+            return "cancelled"
+        return "done"
+
+
+class TokenBucket:
+    """Bandwidth budget shared by every download.
+
+    `consume` blocks until `size` bytes fit in the budget of `rate` bytes per second. Up to
+    one second of unused budget is kept for bursts. A `rate` of None doesn't limit anything.
+    """
+
+    def __init__(self, rate: float | None):
+        self.rate = rate
+        self._tokens = rate or 0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, size: int):
+        if not self.rate:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= size
+            # Debt is paid by sleeping, callers queue up behind the lock
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+            if wait:
+                time.sleep(wait)
+
+
+class DownloadQueue:
+    """Persistent queue of episode downloads.
+
+    A job asks for a range of episodes of an anime from a preferred server. Every episode
+    becomes a task stored in SQLite, so jobs survive restarts and interrupted downloads
+    resume. A scheduler thread runs the queued tasks, highest job priority first:
+
+    - Download links are resolved right before downloading, preferring the job's server
+      and falling back to the next server when a link is not a direct link to a file.
+    - At most `max_active` downloads run at the same time, and at most the limit of its
+      host for each file host (see `DEFAULT_HOST_LIMITS`).
+    - Every download shares a bandwidth budget of `bandwidth` bytes per second.
+    - Failed tasks are retried with the backoff of `policy` until its attempts run out.
+
+    Several queues, e.g. one per process, can share the same database file. A task is
+    claimed atomically by one of them, which keeps a heartbeat on it while it runs, and
+    only tasks whose heartbeat is older than `stale_after` seconds (their queue died) are
+    queued again. The concurrency and bandwidth limits are per queue.
+
+    Args:
+
+      directory: Episodes are saved to `<directory>/<anime>/`
+      resolve: Returns the download links of an episode, given the anime id and episode
+      path: SQLite database of the queue, kept in memory by default
+      downloader: Downloads a single link
+      max_active: Maximum amount of concurrent downloads
+      host_limits: Concurrent downloads per host, by domain suffix
+      default_host_limit: Concurrent downloads of hosts not in `host_limits`
+      bandwidth: Bytes per second of every download together, None for no limit
+      policy: Attempts and backoff of the retries, its deadline is not used
+      stale_after: Seconds without heartbeat after which a running task is taken back
+    """
+
+    def __init__(
+            self,
+            directory: str,
+            *,
+            resolve: Callable[[str, int], List[DownloadLinkInfo]],
+            path: str = ":memory:",
+            downloader: SegmentedDownloader | None = None,
+            max_active: int = 4,
+            host_limits: dict[str, int] | None = None,
+            default_host_limit: int = 2,
+            bandwidth: float | None = None,
+            policy: RetryPolicy = RetryPolicy(attempts=5, base_delay=10, max_delay=600),
+            stale_after: float = 60,
+    ):
+        self.directory = directory
+        self.resolve = resolve
+        self.downloader = downloader or SegmentedDownloader()
+        self.max_active = max_active
+        self.host_limits = DEFAULT_HOST_LIMITS if host_limits is None else host_limits
+        self.default_host_limit = default_host_limit
+        self.bandwidth = TokenBucket(bandwidth)
+        self.policy = policy
+        self.stale_after = stale_after
+
+        # Identifies the tasks claimed by this queue in a database shared with other ones
+        self._owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._beat_at = 0.0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._active: dict[int, threading.Event] = {}
+        self._workers: dict[int, threading.Thread] = {}
+        self._hosts: Counter = Counter()
+        self._task_hosts: dict[int, str] = {}
+        self._progress: dict[int, tuple[int, int | None]] = {}
+
+        # Waits for the writes of the other queues instead of failing with "database is locked"
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        if path != ":memory:":
+            self._db.execute("PRAGMA journal_mode = WAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY,
+                anime TEXT NOT NULL,
+                first_episode INTEGER NOT NULL,
+                last_episode INTEGER NOT NULL,
+                server TEXT,
+                priority INTEGER NOT NULL,
+                created REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS tasks (
+                id INTEGER PRIMARY KEY,
+                job_id INTEGER NOT NULL REFERENCES jobs (id),
+                episode INTEGER NOT NULL,
+                state TEXT NOT NULL,
+                server TEXT,
+                url TEXT,
+                host TEXT,
+                tried TEXT NOT NULL DEFAULT '',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                not_before REAL NOT NULL DEFAULT 0,
+                done_bytes INTEGER NOT NULL DEFAULT 0,
+                total_bytes INTEGER,
+                error TEXT,
+                owner TEXT,
+                heartbeat REAL
+            );
+            CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state, not_before);
+            """
+        )
+        # Databases created before tasks had an owner
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(tasks)")}
+        for column, kind in (("owner", "TEXT"), ("heartbeat", "REAL")):
+            if column not in columns:
+                self._db.execute(f"ALTER TABLE tasks ADD COLUMN {column} {kind}")
+
+        # Tasks of dead processes of this machine are taken back right away, the rest once
+        # their heartbeat is stale. Their downloads resume from disk
+        host = socket.gethostname()
+        for task_id, owner in self._db.execute(
+                "SELECT id, owner FROM tasks WHERE state IN ('resolving', 'running')"
+        ).fetchall():
+            owner_host, _, pid = (owner or "").partition(":")
+            if owner is None or owner_host == host and not _alive(int(pid.partition(":")[0] or 0)):
+                self._db.execute(
+                    "UPDATE tasks SET state = 'queued', owner = NULL WHERE id = ? AND owner IS ?",
+                    (task_id, owner),
+                )
+        self._db.commit()
+
+    def add(self, anime: str, first_episode: int, last_episode: int, server: str | None = None,
+            priority: int = 0) -> int:
+        """Queues the episodes `first_episode` to `last_episode` of `anime`.
+
+        Args:
+
+          anime: Anime id, like as 'nanatsu-no-taizai'
+          first_episode: First episode to download
+          last_episode: Last episode to download, inclusive
+          server: Preferred server, like as 'MEGA'. Any other one is used if it's missing
+          priority: Jobs with a higher priority are downloaded first
+
+        Returns:
+
+          The id of the job
+        """
+        if first_episode > last_episode:
+            raise ValueError(f"Empty episode range: {first_episode}-{last_episode}")
+
+        with self._lock:
+            job_id = self._db.execute(
+                "INSERT INTO jobs (anime, first_episode, last_episode, server, priority, created) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (anime, first_episode, last_episode, server, priority, time.time()),
+            ).lastrowid
+            self._db.executemany(
+                "INSERT INTO tasks (job_id, episode, state) VALUES (?, ?, 'queued')",
+                [(job_id, episode) for episode in range(first_episode, last_episode + 1)],
+            )
+            self._db.commit()
+
+        self._wake.set()
+        return job_id
+
+    def cancel(self, job_id: int):
+        """Stops the running downloads of a job and drops its queued ones. Finished ones are kept."""
+        with self._lock:
+            running = [
+                task_id
+                for (task_id,) in self._db.execute(
+                    "SELECT id FROM tasks WHERE job_id = ? AND state IN ('resolving', 'running')", (job_id,)
+                )
+            ]
+            self._db.execute(
+                "UPDATE tasks SET state = 'cancelled' WHERE job_id = ? AND state NOT IN ('done', 'failed')",
+                (job_id,),
+            )
+            self._db.commit()
+
+            for task_id in running:
+                if task_id in self._active:
+                    self._active[task_id].set()
+
+    def status(self) -> list[JobStatus]:
+        """Every job, newest first."""
+        with self._lock:
+            jobs = self._db.execute(
+                "SELECT id, anime, first_episode, last_episode, server, priority FROM jobs ORDER BY id DESC"
+            ).fetchall()
+            tasks = self._db.execute(
+                "SELECT id, job_id, state, done_bytes, total_bytes, error FROM tasks"
+            ).fetchall()
+            progress = dict(self._progress)
+
+        ret = {
+            job[0]: JobStatus(
+                id=job[0], anime=job[1], first_episode=job[2], last_episode=job[3], server=job[4],
+                priority=job[5], episodes={}, done_bytes=0, total_bytes=0, errors=[],
+            )
+            for job in jobs
+        }
+        for task_id, job_id, state, done_bytes, total_bytes, error in tasks:
+            job = ret[job_id]
+            job.episodes[state] = job.episodes.get(state, 0) + 1
+            done_bytes, total_bytes = progress.get(task_id, (done_bytes, total_bytes))
+            job.done_bytes += done_bytes
+            job.total_bytes += total_bytes or 0
+            if state == "failed" and error:
+                job.errors.append(error)
+
+        return list(ret.values())
+
+    def start(self):
+        """Runs the scheduler in a daemon thread until `stop`. Does nothing if it's already running."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="download-queue", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops the scheduler and the running downloads, which are queued again to resume later."""
+        self._stop.set()
+        self._wake.set()
+        with self._lock:
+            for cancel in self._active.values():
+                cancel.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+        # Their tasks are queued again by `_finish`, which needs the database open
+        with self._lock:
+            workers = list(self._workers.values())
+        for worker in workers:
+            worker.join()
+        with self._lock:
+            self._workers.clear()
+
+    def close(self):
+        self.stop()
+        with self._lock:
+            self._db.close()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self._schedule()
+            except Exception:
+                logger.exception("Download queue scheduling failed")
+            self._wake.wait(1)
+            self._wake.clear()
+
+    def _schedule(self):
+        self._heartbeat()
+
+        with self._lock:
+            self._workers = {task_id: worker for task_id, worker in self._workers.items() if worker.is_alive()}
+            candidates = self._db.execute(
+                "SELECT t.id, t.url, t.host FROM tasks t JOIN jobs j ON j.id = t.job_id "
+                "WHERE t.state = 'queued' AND t.not_before <= ? "
+                "ORDER BY j.priority DESC, j.id, t.episode",
+                (time.time(),),
+            ).fetchall()
+
+            for task_id, url, host in candidates:
+                if len(self._active) >= self.max_active:
+                    break
+                if url is not None and self._hosts[host] >= self._host_limit(host):
+                    continue
+
+                # Claimed only if no other queue sharing the database took it first
+                state = "resolving" if url is None else "running"
+                claimed = self._db.execute(
+                    "UPDATE tasks SET state = ?, owner = ?, heartbeat = ? WHERE id = ? AND state = 'queued'",
+                    (state, self._owner, time.time(), task_id),
+                ).rowcount
+                self._db.commit()
+                if not claimed:
+                    continue
+
+                self._active[task_id] = threading.Event()
+                if url is not None:
+                    self._hosts[host] += 1
+                    self._task_hosts[task_id] = host
+
+                target = self._resolve if url is None else self._download
+                worker = self._workers[task_id] = threading.Thread(
+                    target=target, args=(task_id,), name=f"download-{task_id}", daemon=True
+                )
+                worker.start()
+
+    def _heartbeat(self):
+        """Keeps the tasks of this queue alive, takes back the ones of dead queues and
+        stops the ones cancelled through another queue."""
+        now = time.time()
+        if now - self._beat_at < self.stale_after / 4:
+            return
+        self._beat_at = now
+
+        with self._lock:
+            self._db.execute(
+                "UPDATE tasks SET heartbeat = ? WHERE owner = ? AND state IN ('resolving', 'running')",
+                (now, self._owner),
+            )
+            # Their downloads resume from disk
+            self._db.execute(
+                "UPDATE tasks SET state = 'queued', owner = NULL WHERE state IN ('resolving', 'running') "
+                "AND (heartbeat IS NULL OR heartbeat < ?)",
+                (now - self.stale_after,),
+            )
+            self._db.commit()
+
+            cancelled = {
+                task_id
+                for (task_id,) in self._db.execute(
+                    "SELECT id FROM tasks WHERE owner = ? AND state = 'cancelled'", (self._owner,)
+                )
+            }
+            for task_id in cancelled & self._active.keys():
+                self._active[task_id].set()
+
+    def _host_limit(self, host: str) -> int:
+        for domain, limit in self.host_limits.items():
+            if host == domain or host.endswith(f".{domain}"):
+                return limit
+        return self.default_host_limit
+
+    def _resolve(self, task_id: int):
+        """Picks the link of a task, preferring the job's server among the ones not tried yet."""
+        with self._lock:
+            anime, episode, server, tried = self._db.execute(
+                "SELECT j.anime, t.episode, j.server, t.tried FROM tasks t JOIN jobs j ON j.id = t.job_id "
+                "WHERE t.id = ?",
+                (task_id,),
+            ).fetchone()
+
+        try:
+            links = [link for link in self.resolve(anime, episode) if link.server not in tried.split("\n")]
+        except Exception as exc:
+            self._finish(task_id, exc)
+            return
+
+        links.sort(key=lambda link: server is None or link.server.lower() != server.lower())
+        if not links:
+            self._finish(task_id, NotDirectLinkError(f"No direct download link for {anime}-{episode}"), fatal=True)
+            return
+
+        with self._lock:
+            self._db.execute(
+                "UPDATE tasks SET state = 'queued', server = ?, url = ?, host = ?, owner = NULL "
+                "WHERE id = ? AND state = 'resolving' AND owner = ?",
+                (links[0].server, links[0].url, urlparse(links[0].url).hostname or "", task_id, self._owner),
+            )
+            self._db.commit()
+            self._active.pop(task_id, None)
+        self._wake.set()
+
+    def _download(self, task_id: int):
+        with self._lock:
+            anime, episode, url = self._db.execute(
+                "SELECT j.anime, t.episode, t.url FROM tasks t JOIN jobs j ON j.id = t.job_id WHERE t.id = ?",
+                (task_id,),
+            ).fetchone()
+            cancel = self._active[task_id]
+
+        extension = os.path.splitext(urlparse(url).path)[1] or ".mp4"
+        path = os.path.join(self.directory, anime, f"{anime}-{episode}{extension}")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        def on_progress(progress):
+            self._progress[task_id] = (progress.done, progress.size)
+
+        try:
+            self.downloader.download(url, path, on_progress=on_progress, cancel=cancel,
+                                     throttle=self.bandwidth.consume)
+        except NotDirectLinkError:
+            # Try the next server, without spending an attempt
+            with self._lock:
+                self._db.execute(
+                    "UPDATE tasks SET state = 'queued', tried = tried || server || char(10), url = NULL, "
+                    "host = NULL, owner = NULL WHERE id = ? AND state = 'running' AND owner = ?",
+                    (task_id, self._owner),
+                )
+                self._db.commit()
+            self._release(task_id)
+        except Exception as exc:
+            self._finish(task_id, exc)
+        else:
+            self._finish(task_id, None)
+
+    def _finish(self, task_id: int, error: BaseException | None, fatal: bool = False):
+        """Records the outcome of a task: done, retried later, cancelled or failed."""
+        with self._lock:
+            state, attempts, owner = self._db.execute(
+                "SELECT state, attempts, owner FROM tasks WHERE id = ?", (task_id,)
+            ).fetchone()
+            done_bytes, total_bytes = self._progress.get(task_id, (0, None))
+
+            if owner != self._owner:
+                # Taken back by another queue while this one looked dead, the task is theirs
+                values = None
+            elif error is None:
+                values = ("done", attempts, 0, None)
+            elif state == "cancelled" or isinstance(error, DownloadCancelled):
+                # Cancelled by the user or stopped with the queue, which queues it again
+                values = (state if state == "cancelled" else "queued", attempts, 0, None)
+            elif fatal or attempts + 1 >= self.policy.attempts:
+                values = ("failed", attempts + 1, 0, str(error))
+            else:
+                values = ("queued", attempts + 1, time.time() + self.policy.backoff(attempts), str(error))
+
+            if values is not None:
+                self._db.execute(
+                    "UPDATE tasks SET state = ?, attempts = ?, not_before = ?, error = ?, done_bytes = ?, "
+                    "total_bytes = ?, owner = NULL WHERE id = ?",
+                    (*values, done_bytes, total_bytes, task_id),
+                )
+                self._db.commit()
+
+        if error is not None and not isinstance(error, DownloadCancelled):
+            logger.warning("Download task %s failed: %s", task_id, error)
+        self._release(task_id)
+
+    def _release(self, task_id: int):
+        with self._lock:
+            self._active.pop(task_id, None)
+            self._progress.pop(task_id, None)
+            host = self._task_hosts.pop(task_id, None)
+            if host is not None:
+                self._hosts[host] -= 1
+        self._wake.set()
+
+
+def _alive(pid: int) -> bool:
+    if pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Owned by another user, but running
+        return True
+    return True
+
+
+def main(argv: list[str] | None = None) -> int:
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("anime", nargs="?", help="Anime id, like as 'nanatsu-no-taizai'")
+    arg_parser.add_argument("--first", type=int, help="First episode, the first one of the anime by default")
+    arg_parser.add_argument("--last", type=int, help="Last episode, the last one of the anime by default")
+    arg_parser.add_argument("--server", help="Preferred server, like as 'MEGA'")
+    arg_parser.add_argument("--output", "-o", default="downloads", help="Directory to save the episodes to")
+    arg_parser.add_argument("--queue", help="SQLite file keeping the queue, by default `<output>/queue.db`")
+    arg_parser.add_argument("--bandwidth", type=float, help="Bytes per second of every download together")
+    args = arg_parser.parse_args(argv)
+
+    # Imported here, it builds the shared clients of the app
+    from utils.api_requests import get_anime_episodes, get_episode_links
+
+    os.makedirs(args.output, exist_ok=True)
+    queue = DownloadQueue(
+        args.output,
+        resolve=get_episode_links,
+        path=args.queue or os.path.join(args.output, "queue.db"),
+        bandwidth=args.bandwidth,
+    )
+
+    if args.anime:
+        first, last = args.first, args.last
+        if first is None or last is None:
+            numbers = [int(episode.id) for episode in get_anime_episodes(args.anime)]
+            if not numbers:
+                print(f"{args.anime} has no episodes", file=sys.stderr)
+                return 1
+            first = min(numbers) if first is None else first
+            last = max(numbers) if last is None else last
+        queue.add(args.anime, first, last, server=args.server)
+
+    queue.start()
+    try:
+        while True:
+            jobs = queue.status()
+            for job in jobs:
+                progress = f"{job.done_bytes / job.total_bytes:.0%}" if job.total_bytes else "-"
+                print(f"{job.anime} {job.first_episode}-{job.last_episode}: {job.state} "
+                      f"{job.episodes.get('done', 0)}/{job.last_episode - job.first_episode + 1} {progress}",
+                      file=sys.stderr)
+            if all(job.state in ("done", "failed", "cancelled") for job in jobs):
+                break
+            time.sleep(5)
+    except KeyboardInterrupt:
+        # The running downloads are queued again, the next run resumes them
+        return 130
+    finally:
+        queue.close()
+
+    for job in jobs:
+        for error in job.errors:
+            print(f"{job.anime}: {error}", file=sys.stderr)
+    return 0 if all(job.state == "done" for job in jobs) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,367 @@
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Callable
+
+import requests
+
+_CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+
+
+class DownloadError(Exception):
+    """Raised when a file can't be downloaded or doesn't match the size announced upstream."""
+
+
+class NotDirectLinkError(DownloadError):
+    """Raised when a link leads to a web page (e.g. a file host's download page) instead of a file."""
+
+
+class DownloadCancelled(DownloadError):
+    """Raised when a download is stopped through its `cancel` event. Progress is kept."""
+
+
+@dataclass(kw_only=True)
+class Segment:
+    """Byte range of a download handled by a single connection.
+
+    Attributes:
+
+      start: First byte of the segment
+      end: Last byte of the segment, inclusive
+      done: Bytes of the segment already written to disk
+    """
+
+    start: int
+    end: int
+    done: int = 0
+
+    @property
+    def size(self) -> int:
+        return self.end - self.start + 1
+
+    @property
+    def complete(self) -> bool:
+        return self.done >= self.size
+
+
+@dataclass(kw_only=True)
+class DownloadProgress:
+    """Snapshot passed to the progress callback.
+
+    Attributes:
+
+      url: Url being downloaded
+      path: Final path of the file
+      size: Total bytes, None if upstream doesn't announce it
+      done: Bytes written so far, including the ones of a resumed download
+      segments: Amount of parallel segments
+    """
+
+    url: str
+    path: str
+    size: int | None
+    done: int
+    segments: int
+
+
+class SegmentedDownloader:
+    """Downloads direct HTTP links over several connections at once.
+
+    When the server supports `Range` requests the file is split in up to `segments` byte
+    ranges downloaded in parallel, each one writing at its own offset of a file preallocated
+    to the final size. Progress is saved next to the file (`<path>.part.json`) so an
+    interrupted download resumes from the bytes already written, as long as upstream still
+    serves the same file (same size and `ETag`/`Last-Modified`). The file only gets its
+    final name once every segment is complete and its size matches the announced one.
+
+    Servers without `Range` support are downloaded with a single connection, from scratch.
+
+    Args:
+
+      segments: Maximum amount of parallel connections per file
+      min_segment_size: Files are not split in segments smaller than this, in bytes
+      chunk_size: Bytes read from the socket at a time
+      attempts: Times a segment is requested before giving up, resuming where it stopped.
+        Requests that fail or end without any data count, and are retried with a backoff
+      timeout: Seconds to wait for the server to connect or send data
+      session_factory: Builds the `requests` session of each connection
+    """
+
+    def __init__(
+            self,
+            *,
+            segments: int = 4,
+            min_segment_size: int = 1 << 20,
+            chunk_size: int = 256 << 10,
+            attempts: int = 3,
+            timeout: float = 30,
+            session_factory: Callable[[], requests.Session] = requests.Session,
+    ):
+        self.segments = segments
+        self.min_segment_size = min_segment_size
+        self.chunk_size = chunk_size
+        self.attempts = attempts
+        self.timeout = timeout
+        self.session_factory = session_factory
+
+    def download(
+            self,
+            url: str,
+            path: str,
+            *,
+            on_progress: Callable[[DownloadProgress], None] | None = None,
+            cancel: threading.Event | None = None,
+            throttle: Callable[[int], None] | None = None,
+    ) -> str:
+        """Downloads `url` to `path`, resuming a previous attempt if there is one.
+
+        Args:
+
+          url: Direct link to the file
+          path: Where to save the file
+          on_progress: Called from the download threads every time a chunk is written
+          cancel: Set it to stop the download, which raises `DownloadCancelled`
+          throttle: Called with the size of every chunk before it's written, blocking to
+            limit the bandwidth
+
+        Returns:
+
+          The path of the downloaded file
+        """
+        cancel = cancel or threading.Event()
+        with self.session_factory() as session:
+            size, validator = self._probe(session, url)
+
+        if size is None:
+            return self._download_single(url, path, on_progress, cancel, throttle)
+
+        part_path, state_path = f"{path}.part", f"{path}.part.json"
+        segments = self._load_state(state_path, part_path, url, size, validator)
+        if segments is None:
+            segments = self._split(size)
+            with open(part_path, "wb") as f:
+                _preallocate(f, size)
+
+        tracker = _Tracker(
+            progress=DownloadProgress(url=url, path=path, size=size, done=sum(s.done for s in segments),
+                                      segments=len(segments)),
+            on_progress=on_progress,
+            save=lambda: _save_state(state_path, url, size, validator, segments),
+            throttle=throttle,
+        )
+        tracker.save()
+
+        pending = [segment for segment in segments if not segment.complete]
+        if pending:
+            with ThreadPoolExecutor(max_workers=len(pending)) as executor:
+                futures = [
+                    executor.submit(self._download_segment, url, part_path, segment, validator, tracker, cancel)
+                    for segment in pending
+                ]
+                errors = [future.exception() for future in futures]
+            tracker.save()
+            for error in errors:
+                if error is not None:
+                    raise error
+
+        actual = os.path.getsize(part_path)
+        if not all(segment.complete for segment in segments) or actual != size:
+            raise DownloadError(f"Downloaded {actual} bytes of {size} from {url}")
+
+        os.replace(part_path, path)
+        os.remove(state_path)
+        return path
+
+    def _probe(self, session: requests.Session, url: str) -> tuple[int | None, str | None]:
+        """Size of the file if the server supports ranges, and the validator of its version."""
+        with session.get(url, headers={"Range": "bytes=0-0"}, stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            if response.headers.get("Content-Type", "").startswith("text/html"):
+                raise NotDirectLinkError(f"Not a direct link to a file: {url}")
+
+            match = _CONTENT_RANGE.match(response.headers.get("Content-Range", ""))
+            if response.status_code != 206 or match is None or match.group(3) == "*":
+                return None, None
+
+            validator = response.headers.get("ETag") or response.headers.get("Last-Modified")
+            # Weak ETags can't be used with If-Range
+            if validator is not None and validator.startswith("W/"):
+                validator = None
+            return int(match.group(3)), validator
+
+    def _split(self, size: int) -> list[Segment]:
+        count = max(1, min(self.segments, size // self.min_segment_size))
+        step = -(-size // count)
+        return [Segment(start=start, end=min(start + step, size) - 1) for start in range(0, size, step)]
+
+    def _load_state(
+            self, state_path: str, part_path: str, url: str, size: int, validator: str | None
+    ) -> list[Segment] | None:
+        try:
+            with open(state_path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if (
+                state.get("url") != url
+                or state.get("size") != size
+                or state.get("validator") != validator
+                or validator is None
+                or not os.path.exists(part_path)
+                or os.path.getsize(part_path) != size
+        ):
+            # Upstream changed or there's no way to tell, start over
+            return None
+
+        return [Segment(**segment) for segment in state["segments"]]
+
+    def _download_segment(
+            self,
+            url: str,
+            part_path: str,
+            segment: Segment,
+            validator: str | None,
+            tracker: "_Tracker",
+            cancel: threading.Event,
+    ):
+        errors = []
+        # Unbuffered, the progress saved never counts bytes that are not in the file yet
+        with self.session_factory() as session, open(part_path, "r+b", buffering=0) as f:
+            while not segment.complete and len(errors) < self.attempts:
+                if errors and cancel.wait(min(0.5 * 2 ** (len(errors) - 1), 10)):
+                    raise DownloadCancelled(url)
+
+                offset = segment.start + segment.done
+                headers = {"Range": f"bytes={offset}-{segment.end}"}
+                if validator is not None:
+                    headers["If-Range"] = validator
+
+                try:
+                    with session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+                        response.raise_for_status()
+                        if response.status_code != 206:
+                            # The file changed upstream, the server ignored the range
+                            raise DownloadError(f"{url} changed while it was being downloaded")
+
+                        match = _CONTENT_RANGE.match(response.headers.get("Content-Range", ""))
+                        if match is None or int(match.group(1)) != offset:
+                            # Written at the wrong offset the file would be corrupt with the right size
+                            raise DownloadError(
+                                f"{url} answered the range from {offset} with "
+                                f"{response.headers.get('Content-Range')!r}"
+                            )
+
+                        f.seek(offset)
+                        for chunk in response.iter_content(self.chunk_size):
+                            if cancel.is_set():
+                                raise DownloadCancelled(url)
+                            chunk = chunk[:segment.size - segment.done]
+                            tracker.throttle(len(chunk))
+                            f.write(chunk)
+                            tracker.advance(segment, len(chunk))
+                            if segment.complete:
+                                break
+
+                    if segment.start + segment.done == offset:
+                        errors.append(DownloadError(f"{url} sent no data from byte {offset}"))
+                except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as exc:
+                    errors.append(exc)
+
+            if not segment.complete:
+                raise DownloadError(f"Segment {segment.start}-{segment.end} of {url} failed: {errors[-1]}")
+
+    def _download_single(
+            self,
+            url: str,
+            path: str,
+            on_progress: Callable[[DownloadProgress], None] | None,
+            cancel: threading.Event,
+            throttle: Callable[[int], None] | None,
+    ) -> str:
+        part_path = f"{path}.part"
+        tracker = _Tracker(
+            progress=DownloadProgress(url=url, path=path, size=None, done=0, segments=1),
+            on_progress=on_progress,
+            save=lambda: None,
+            throttle=throttle,
+        )
+
+        with self.session_factory() as session, open(part_path, "wb") as f:
+            with session.get(url, stream=True, timeout=self.timeout) as response:
+                response.raise_for_status()
+                expected = response.headers.get("Content-Length")
+                for chunk in response.iter_content(self.chunk_size):
+                    if cancel.is_set():
+                        raise DownloadCancelled(url)
+                    tracker.throttle(len(chunk))
+                    f.write(chunk)
+                    tracker.advance(None, len(chunk))
+
+        actual = os.path.getsize(part_path)
+        if expected is not None and actual != int(expected):
+            raise DownloadError(f"Downloaded {actual} bytes of {expected} from {url}")
+
+        os.replace(part_path, path)
+        return path
+
+
+class _Tracker:
+    """Counts the bytes written by every segment, reporting them and saving them at most once a second."""
+
+    def __init__(
+            self,
+            *,
+            progress: DownloadProgress,
+            on_progress,
+            save: Callable[[], None],
+            throttle: Callable[[int], None] | None = None,
+            interval: float = 1,
+    ):
+        self.progress = progress
+        self.on_progress = on_progress
+        self.save_state = save
+        self.throttle = throttle or (lambda size: None)
+        self.interval = interval
+        self._saved_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def advance(self, segment: Segment | None, written: int):
+        with self._lock:
+            if segment is not None:
+                segment.done += written
+            self.progress.done += written
+
+            if time.monotonic() - self._saved_at >= self.interval:
+                self.save_state()
+                self._saved_at = time.monotonic()
+
+            if self.on_progress is not None:
+                self.on_progress(self.progress)
+
+    def save(self):
+        with self._lock:
+            self.save_state()
+
+
+def _save_state(state_path: str, url: str, size: int, validator: str | None, segments: list[Segment]):
+    # Written aside and renamed, a crash never leaves a truncated state behind
+    with open(f"{state_path}.tmp", "w") as f:
+        json.dump(
+            {"url": url, "size": size, "validator": validator, "segments": [asdict(s) for s in segments]}, f
+        )
+    os.replace(f"{state_path}.tmp", state_path)
+
+
+def _preallocate(f, size: int):
+    f.truncate(size)
+    if hasattr(os, "posix_fallocate") and size:
+        try:
+            os.posix_fallocate(f.fileno(), 0, size)
+        except OSError:
+            # Not supported by every filesystem, the sparse file is enough
+            pass
@@ -0,0 +1,118 @@
+"""Export the download links of a whole anime for external download managers.
+
+Episodes are written as soon as their links are resolved, one entry per episode and
+server, so long series start producing output right away and are never held in memory:
+
+    python -m utils.export nanatsu-no-taizai --format aria2 --output nanatsu.aria2
+    aria2c --input-file nanatsu.aria2
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+from typing import Callable, Iterable, TextIO
+from urllib.parse import urlparse
+
+from api.animeflv import EpisodeInfoDownload
+from utils.api_requests import MAX_LINK_WORKERS, iter_anime_episode_info_download
+
+CSV_FIELDS = ("anime", "episode", "server", "url", "error")
+
+
+def export_jsonl(episodes: Iterable[EpisodeInfoDownload], out: TextIO):
+    """One JSON object per line and link. Episodes without links are a line with their error."""
+    for e in episodes:
+        for entry in _entries(e):
+            out.write(json.dumps(entry, ensure_ascii=False))
+            out.write("\n")
+        out.flush()
+
+
+def export_csv(episodes: Iterable[EpisodeInfoDownload], out: TextIO):
+    """A header and one row per link. Episodes without links are a row with their error."""
+    writer = csv.DictWriter(out, fieldnames=CSV_FIELDS)
+    writer.writeheader()
+    for e in episodes:
+        writer.writerows(_entries(e))
+        out.flush()
+
+
+def export_aria2(episodes: Iterable[EpisodeInfoDownload], out: TextIO):
+    """aria2c input file, every link saved as `<anime>/<anime>-<episode>-<server><ext>`.
+
+    Episodes without links are written as comments.
+    """
+    for e in episodes:
+        if e.error:
+            out.write(f"# {e.anime}-{e.id}: {e.error}\n")
+        for link in e.downloads or []:
+            out.write(f"{link.url}\n  dir={e.anime}\n  out={_filename(e, link.server, link.url)}\n")
+        out.flush()
+
+
+def export_wget(episodes: Iterable[EpisodeInfoDownload], out: TextIO):
+    """wget input file, one url per line. Episodes without links are skipped."""
+    for e in episodes:
+        for link in e.downloads or []:
+            out.write(f"{link.url}\n")
+        out.flush()
+
+
+EXPORTERS: dict[str, Callable[[Iterable[EpisodeInfoDownload], TextIO], None]] = {
+    "jsonl": export_jsonl,
+    "csv": export_csv,
+    "aria2": export_aria2,
+    "wget": export_wget,
+}
+
+
+def export_anime(id: str, format: str, out: TextIO, max_workers: int = MAX_LINK_WORKERS):
+    """Resolves every episode of anime `id` and writes its links to `out` as they arrive.
+
+    Args:
+
+      id: Anime id, like as 'nanatsu-no-taizai'
+      format: One of `EXPORTERS`
+      out: Text file to write to
+      max_workers: Maximum amount of concurrent requests
+    """
+    if format not in EXPORTERS:
+        raise ValueError(f"Unknown export format: {format}")
+
+    EXPORTERS[format](iter_anime_episode_info_download(id, max_workers=max_workers), out)
+
+
+def _entries(e: EpisodeInfoDownload) -> list[dict]:
+    if not e.downloads:
+        return [{"anime": e.anime, "episode": e.id, "server": None, "url": None, "error": e.error}]
+    return [
+        {"anime": e.anime, "episode": e.id, "server": link.server, "url": link.url, "error": None}
+        for link in e.downloads
+    ]
+
+
+def _filename(e: EpisodeInfoDownload, server: str, url: str) -> str:
+    extension = os.path.splitext(urlparse(url).path)[1] or ".mp4"
+    return f"{e.anime}-{e.id}-{server}{extension}".replace("/", "_")
+
+
+def main(argv: list[str] | None = None) -> int:
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("anime", help="Anime id, like as 'nanatsu-no-taizai'")
+    arg_parser.add_argument("--format", "-f", choices=sorted(EXPORTERS), default="jsonl")
+    arg_parser.add_argument("--output", "-o", help="Write to this file instead of stdout")
+    arg_parser.add_argument("--workers", type=int, default=MAX_LINK_WORKERS, help="Concurrent requests")
+    args = arg_parser.parse_args(argv)
+
+    if args.output:
+        with open(args.output, "w", newline="" if args.format == "csv" else None, encoding="utf-8") as f:
+            export_anime(args.anime, args.format, f, max_workers=args.workers)
+    else:
+        export_anime(args.anime, args.format, sys.stdout, max_workers=args.workers)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
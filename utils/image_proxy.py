@@ -0,0 +1,239 @@
+import hashlib
+import io
+import os
+import threading
+from urllib.parse import parse_qs, urlencode, urlparse
+
+import cloudscraper
+
+from api.singleflight import SingleFlight
+
+PROXY_PATH = "/img"
+
+# Widest image of the UI, `image_component` is at most 15rem wide, doubled for HiDPI screens
+MAX_WIDTH = 2 * 240
+
+# Only images of these domains (and their subdomains) are proxied, so the route can't be
+# used to fetch arbitrary urls from the server
+ALLOWED_DOMAINS = ("animeflv.net",)
+
+CACHE_CONTROL = "public, max-age=2592000, immutable"
+
+
+class ImageCache:
+    """Remote images resized to the displayed size and kept on disk.
+
+    An image is downloaded once per width, shrunk to at most `width` pixels wide (never
+    enlarged) and saved as JPEG under `directory`, named after the hash of its url and
+    width. Resizing needs Pillow, without it the original image is cached as is.
+
+    The ETag of every image is saved next to it, in a `.etag` file. Once the directory
+    holds more than `max_bytes`, the least recently served images are removed.
+
+    Args:
+
+      directory: Where the images are saved, created with the first one
+      timeout: Seconds to wait for the upstream image
+      max_bytes: Size of the directory above which images are evicted
+    """
+
+    def __init__(self, directory: str, *, timeout: float = 15, max_bytes: int = 256 * 1024 * 1024):
+        self.directory = directory
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self._flight = SingleFlight()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # Measured on the first download, the directory is only created then
+        self._size: int | None = None
+
+    def get(self, src: str, width: int) -> tuple[bytes, str, str]:
+        """Returns the content, content type and ETag of `src` at most `width` pixels wide."""
+        path = os.path.join(self.directory, hashlib.sha256(f"{width}:{src}".encode()).hexdigest())
+
+        try:
+            content, etag = self._read(path)
+        except FileNotFoundError:
+            self._flight.do(path, lambda: self._fetch(src, width, path))
+            content, etag = self._read(path)
+
+        return content, _content_type(content), etag
+
+    def _read(self, path: str) -> tuple[bytes, str]:
+        with open(path, "rb") as f:
+            content = f.read()
+
+        try:
+            with open(f"{path}.etag") as f:
+                etag = f.read()
+        except FileNotFoundError:
+            etag = _etag(content)
+
+        # The modification time is the last access, the eviction order
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return content, etag
+
+    def _fetch(self, src: str, width: int, path: str):
+        if os.path.exists(path):
+            return
+
+        scraper = getattr(self._local, "scraper", None)
+        if scraper is None:
+            # cloudscraper sessions are not safe to share between threads
+            scraper = self._local.scraper = cloudscraper.create_scraper()
+
+        response = scraper.get(src, timeout=self.timeout)
+        response.raise_for_status()
+
+        content = _resize(response.content, width)
+        etag = _etag(content)
+        os.makedirs(self.directory, exist_ok=True)
+
+        # Written aside and renamed, readers never see a partial image. The ETag goes
+        # first, so an image is never without it
+        with open(f"{path}.etag", "w") as f:
+            f.write(etag)
+        with open(f"{path}.tmp", "wb") as f:
+            f.write(content)
+        os.replace(f"{path}.tmp", path)
+
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._entries())
+            else:
+                self._size += len(content) + len(etag)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _entries(self) -> list[tuple[str, int, float]]:
+        """Path, size (with its ETag file) and last access of every cached image."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if "." in entry.name:
+                continue
+            try:
+                stat = entry.stat()
+                size = stat.st_size
+                if os.path.exists(f"{entry.path}.etag"):
+                    size += os.path.getsize(f"{entry.path}.etag")
+            except FileNotFoundError:
+                continue
+            entries.append((entry.path, size, stat.st_mtime))
+        return entries
+
+    def _evict(self):
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        self._size = sum(size for _, size, _ in entries)
+
+        for path, size, _ in entries:
+            if self._size <= self.max_bytes:
+                break
+            for name in (path, f"{path}.etag"):
+                try:
+                    os.remove(name)
+                except FileNotFoundError:
+                    pass
+            self._size -= size
+
+
+class ImageProxy:
+    """WSGI middleware serving `PROXY_PATH` from an `ImageCache`, everything else goes to `app`.
+
+    `GET /img?src=<url>&w=<width>` answers with the resized image, a content hash ETag
+    (`If-None-Match` gets a 304) and a long `Cache-Control`, so browsers keep it and
+    repeated views don't even reach the server.
+    """
+
+    # Set by the first request going through the proxy, until then `proxy_url` keeps the
+    # remote urls (e.g. when the app runs with `mesop main.py` instead of `gunicorn main:app`)
+    active = False
+
+    def __init__(self, app, cache: ImageCache):
+        self.app = app
+        self.cache = cache
+
+    def __call__(self, environ, start_response):
+        ImageProxy.active = True
+        if environ.get("PATH_INFO") != PROXY_PATH:
+            return self.app(environ, start_response)
+
+        query = parse_qs(environ.get("QUERY_STRING", ""))
+        src = query.get("src", [""])[0]
+        try:
+            width = min(MAX_WIDTH, int(query.get("w", [MAX_WIDTH])[0]))
+        except ValueError:
+            width = MAX_WIDTH
+
+        if not _allowed(src) or width <= 0:
+            return _respond(start_response, "403 Forbidden")
+
+        try:
+            content, content_type, etag = self.cache.get(src, width)
+        except Exception:
+            return _respond(start_response, "502 Bad Gateway")
+
+        headers = [("ETag", etag), ("Cache-Control", CACHE_CONTROL)]
+        if environ.get("HTTP_IF_NONE_MATCH") == etag:
+            return _respond(start_response, "304 Not Modified", headers)
+
+        return _respond(
+            start_response,
+            "200 OK",
+            headers + [("Content-Type", content_type), ("Content-Length", str(len(content)))],
+            content,
+        )
+
+
+def proxy_url(src: str | None, width: int = MAX_WIDTH) -> str | None:
+    """Url of `src` through the image proxy, or `src` itself if it can't be proxied."""
+    if not ImageProxy.active or not _allowed(src):
+        return src
+    return f"{PROXY_PATH}?{urlencode({'src': src, 'w': width})}"
+
+
+def _allowed(src: str | None) -> bool:
+    if not src:
+        return False
+    parsed = urlparse(src)
+    host = parsed.hostname or ""
+    return parsed.scheme in ("http", "https") and any(
+        host == domain or host.endswith(f".{domain}") for domain in ALLOWED_DOMAINS
+    )
+
+
+def _resize(content: bytes, width: int) -> bytes:
+    try:
+        from PIL import Image
+    except ImportError:
+        return content
+
+    with Image.open(io.BytesIO(content)) as image:
+        if image.width > width:
+            image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+        out = io.BytesIO()
+        image.convert("RGB").save(out, "JPEG", quality=85, optimize=True, progressive=True)
+        return out.getvalue()
+
+
+def _etag(content: bytes) -> str:
+    return f'"{hashlib.sha256(content).hexdigest()[:32]}"'
+
+
+def _content_type(content: bytes) -> str:
+    if content.startswith(b"\xff\xd8"):
+        return "image/jpeg"
+    if content.startswith(b"\x89PNG"):
+        return "image/png"
+    if content[8:12] == b"WEBP":
+        return "image/webp"
+    if content.startswith(b"GIF8"):
+        return "image/gif"
+    return "application/octet-stream"
+
+
+def _respond(start_response, status: str, headers: list | None = None, body: bytes = b""):
+    start_response(status, headers or [])
+    return [body]
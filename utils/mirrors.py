@@ -0,0 +1,152 @@
+import logging
+import math
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Iterable, List
+from urllib.parse import urlparse
+
+import requests
+
+from api.animeflv import DownloadLinkInfo
+from utils.table_store import TableStore
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(kw_only=True)
+class MirrorStats:
+    """Last measurement of a mirror host.
+
+    Attributes:
+
+      host: Host of the download links, like as 'mega.nz'
+      healthy: Whether the host answered without an error
+      latency: Seconds to open a TCP connection to the host
+      throughput: Bytes per second of the sampled response
+      error: Why the host is not healthy
+    """
+
+    host: str
+    healthy: bool
+    latency: float | None = None
+    throughput: float | None = None
+    error: str | None = None
+
+
+class MirrorProber:
+    """Measures how fast the hosts of the download links answer, to offer the fastest first.
+
+    Every host is measured once per `ttl` seconds, whatever the amount of links it serves:
+    the time to open a TCP connection and the throughput of reading the first
+    `sample_bytes` of one of its links. Hosts are measured in parallel, so measuring the
+    links of a page takes at most about `timeout` seconds. `refresh` does it in the
+    background, so pages can render with the stats at hand and show the ranking once
+    they're taken.
+    """
+
+    def __init__(
+            self,
+            *,
+            ttl: float = 10 * 60,
+            sample_bytes: int = 64 << 10,
+            timeout: float = 3,
+            max_workers: int = 8,
+    ):
+        self.sample_bytes = sample_bytes
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self._stats = TableStore(max_entries=1024, max_age=ttl)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mirrors")
+        self._pending: set[str] = set()
+        self._lock = threading.Lock()
+
+    def measure(self, urls: Iterable[str]) -> dict[str, MirrorStats]:
+        """Stats of the host of every url, measuring the ones not measured in the last `ttl` seconds."""
+        samples = {}
+        for url in urls:
+            samples.setdefault(_host(url), url)
+        samples.pop("", None)
+
+        if not samples:
+            return {}
+
+        def measure(host: str) -> MirrorStats:
+            return self._stats.get(host, lambda: self._probe(host, samples[host]))
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(samples)))) as executor:
+            return dict(zip(samples, executor.map(measure, samples)))
+
+    def refresh(self, urls: Iterable[str]):
+        """Measures in the background the hosts of `urls` without stats, returns right away."""
+        samples = {}
+        for url in urls:
+            host = _host(url)
+            if host and self._stats.peek(host) is None:
+                samples.setdefault(host, url)
+
+        with self._lock:
+            samples = {host: url for host, url in samples.items() if host not in self._pending}
+            self._pending.update(samples)
+        if samples:
+            self._executor.submit(self._refresh, samples)
+
+    def _refresh(self, samples: dict[str, str]):
+        try:
+            self.measure(samples.values())
+        except Exception:
+            logger.warning("Measuring mirrors %s failed", list(samples), exc_info=True)
+        finally:
+            with self._lock:
+                self._pending.difference_update(samples)
+
+    def rank(self, links: List[DownloadLinkInfo]) -> List[tuple[DownloadLinkInfo, MirrorStats | None]]:
+        """Links with the stats of their host, healthy hosts with the best throughput first.
+
+        Only measurements already taken are used, the order of unmeasured links is kept
+        after the measured healthy ones.
+        """
+        ranked = [(link, self._stats.peek(_host(link.url))) for link in links]
+        return sorted(ranked, key=lambda entry: _score(entry[1]))
+
+    def _probe(self, host: str, url: str) -> MirrorStats:
+        parsed = urlparse(url)
+        port = parsed.port or (443 if parsed.scheme == "https" else 80)
+
+        try:
+            start = time.perf_counter()
+            socket.create_connection((parsed.hostname, port), timeout=self.timeout).close()
+            latency = time.perf_counter() - start
+
+            with requests.get(url, headers={"Range": f"bytes=0-{self.sample_bytes - 1}"}, stream=True,
+                              timeout=self.timeout) as response:
+                response.raise_for_status()
+                start = time.perf_counter()
+                received = 0
+                for chunk in response.iter_content(16 << 10):
+                    received += len(chunk)
+                    if received >= self.sample_bytes or time.perf_counter() - start > self.timeout:
+                        break
+                elapsed = time.perf_counter() - start
+        except (OSError, requests.RequestException) as exc:
+            return MirrorStats(host=host, healthy=False, error=str(exc))
+
+        return MirrorStats(host=host, healthy=True, latency=latency,
+                           throughput=received / elapsed if elapsed > 0 else math.inf)
+
+
+def _host(url: str) -> str:
+    parsed = urlparse(url)
+    if not parsed.hostname:
+        return ""
+    return parsed.hostname if parsed.port is None else f"{parsed.hostname}:{parsed.port}"
+
+
+def _score(stats: MirrorStats | None) -> tuple:
+    if stats is None:
+        return 1, 0, 0
+    if not stats.healthy:
+        return 2, 0, 0
+    return 0, -stats.throughput, stats.latency
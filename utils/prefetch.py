@@ -0,0 +1,58 @@
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Generic, Hashable, Iterable, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class Prefetcher(Generic[T]):
+    """Warms caches in the background with a small pool of workers.
+
+    Items are submitted in batches, one per search for example, and a batch can be
+    cancelled when it stops being useful: its items not started yet are dropped and the
+    running ones see their `cancel` event set, to stop at their next check. Failures are
+    logged and ignored, prefetching is only an optimization.
+
+    Args:
+
+      warm: Warms the caches for an item. Gets the item and the cancel event of its batch
+      max_workers: Maximum amount of items warmed at the same time
+    """
+
+    def __init__(self, warm: Callable[[T, threading.Event], None], *, max_workers: int = 2):
+        self.warm = warm
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self._batches: dict[Hashable, tuple[threading.Event, list[Future]]] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, batch: Hashable, items: Iterable[T]):
+        """Warms `items` in order, replacing the batch with the same key if there's one."""
+        self.cancel(batch)
+        cancel = threading.Event()
+        futures = [self._executor.submit(self._warm, item, cancel) for item in items]
+
+        with self._lock:
+            # Forget the batches that are over
+            for key, (_, pending) in list(self._batches.items()):
+                if all(future.done() for future in pending):
+                    del self._batches[key]
+            self._batches[batch] = (cancel, futures)
+
+    def cancel(self, batch: Hashable):
+        with self._lock:
+            cancel, futures = self._batches.pop(batch, (None, []))
+        if cancel is not None:
+            cancel.set()
+        for future in futures:
+            future.cancel()
+
+    def _warm(self, item: T, cancel: threading.Event):
+        if cancel.is_set():
+            return
+        try:
+            self.warm(item, cancel)
+        except Exception:
+            logger.warning("Prefetching %s failed", item, exc_info=True)
@@ -0,0 +1,199 @@
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, List, Literal
+
+import requests
+from cloudscraper.exceptions import CloudflareException
+
+CircuitState = Literal["closed", "open", "half-open"]
+
+
+class RetryError(Exception):
+    """Raised when a call keeps failing after every attempt allowed by the policy."""
+
+    def __init__(self, message: str, errors: List[BaseException]):
+        super().__init__(message)
+        self.errors = errors
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling upstream while the circuit breaker is open."""
+
+
+@dataclass(kw_only=True)
+class RetryPolicy:
+    """How a failing call is retried.
+
+    Attributes:
+
+      attempts: Maximum amount of calls, including the first one
+      base_delay: Backoff of the first retry in seconds, doubled on every retry
+      max_delay: Upper bound of a single backoff in seconds
+      deadline: Seconds after which no more retries are started
+    """
+
+    attempts: int = 4
+    base_delay: float = 0.5
+    max_delay: float = 8
+    deadline: float = 20
+
+    def backoff(self, retry: int) -> float:
+        """Exponential backoff with full jitter for the given retry (starting at 0)."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** retry))
+
+
+@dataclass
+class RetryMetrics:
+    """Counters of every call made through `call_with_retry`."""
+
+    calls: int = 0
+    attempts: int = 0
+    retries: int = 0
+    successes: int = 0
+    failures: int = 0
+    fatal: int = 0
+    short_circuited: int = 0
+    deadline_exceeded: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def add(self, **counters: int):
+        with self._lock:
+            for name, value in counters.items():
+                setattr(self, name, getattr(self, name) + value)
+
+
+class CircuitBreaker:
+    """Fails fast while upstream is down.
+
+    After `failure_threshold` consecutive retryable failures the circuit opens and every
+    call is rejected with `CircuitOpenError` for `reset_timeout` seconds. Then a single
+    trial call is let through (half-open): success closes the circuit, failure opens it
+    again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> CircuitState:
+        with self._lock:
+            return self._state()
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial = False
+
+    def _state(self) -> CircuitState:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Whether `exc` is a transient upstream failure worth retrying.
+
+    Connection problems, timeouts, 429 and 5xx responses are retried. Anything else, such
+    as an unsolvable Cloudflare challenge, a 404 or a page that can't be parsed, fails
+    at once.
+    """
+    if isinstance(exc, CloudflareException):
+        return False
+    if isinstance(exc, requests.HTTPError):
+        status = exc.response.status_code if exc.response is not None else None
+        return status is None or status == 429 or status >= 500
+    return isinstance(exc, (requests.ConnectionError, requests.Timeout))
+
+
+def call_with_retry(
+        func: Callable,
+        *args,
+        policy: RetryPolicy,
+        breaker: CircuitBreaker | None = None,
+        metrics: RetryMetrics | None = None,
+        retryable: Callable[[BaseException], bool] = is_retryable,
+):
+    """Calls `func(*args)` retrying retryable errors as described by `policy`.
+
+    Fatal errors are raised as is. `RetryError` is raised once the attempts or the deadline
+    are exhausted, or when `breaker` opens after some attempts, and `CircuitOpenError` if
+    `breaker` rejects the call before its first attempt.
+    """
+    metrics = metrics if metrics is not None else RetryMetrics()
+    metrics.add(calls=1)
+    start = time.monotonic()
+    errors: List[BaseException] = []
+
+    for attempt in range(policy.attempts):
+        if breaker is not None and not breaker.allow():
+            if errors:
+                # Opened by another call while this one waited, its failures still count
+                metrics.add(failures=1)
+                raise RetryError(f"Gave up after {len(errors)} attempts, circuit open", errors)
+            metrics.add(short_circuited=1)
+            raise CircuitOpenError("Upstream is unavailable, try again later")
+
+        metrics.add(attempts=1)
+        try:
+            result = func(*args)
+        except Exception as exc:
+            if not retryable(exc):
+                # Upstream answered, it is just not something a retry can fix
+                if breaker is not None:
+                    breaker.record_success()
+                metrics.add(fatal=1)
+                raise
+            if breaker is not None:
+                breaker.record_failure()
+            errors.append(exc)
+        else:
+            if breaker is not None:
+                breaker.record_success()
+            metrics.add(successes=1)
+            return result
+
+        if attempt + 1 == policy.attempts:
+            break
+
+        # Not `allow`, which would take the trial call of a half-open circuit
+        if breaker is not None and breaker.state == "open":
+            metrics.add(failures=1)
+            raise RetryError(f"Gave up after {len(errors)} attempts, circuit open", errors)
+
+        delay = policy.backoff(attempt)
+        if time.monotonic() - start + delay > policy.deadline:
+            metrics.add(deadline_exceeded=1, failures=1)
+            raise RetryError(f"Gave up after {len(errors)} attempts, deadline exceeded", errors)
+
+        metrics.add(retries=1)
+        time.sleep(delay)
+
+    metrics.add(failures=1)
+    raise RetryError(f"Gave up after {len(errors)} attempts", errors)
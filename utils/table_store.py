@@ -0,0 +1,59 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class TableStore:
+    """Server-side store of materialized objects (data frames, parsed results...) keyed by a
+    small handle, so the Mesop state only has to carry the handle.
+
+    Entries are evicted least recently used first once there are more than `max_entries`,
+    and reloaded once they are older than `max_age` seconds. Since an entry can be missing
+    (evicted, or the session is served by another worker) every read comes with the loader
+    able to rebuild it.
+
+    Stored objects are shared between sessions and must not be mutated.
+    """
+
+    def __init__(self, max_entries: int = 256, max_age: float = 300):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, loader: Callable[[], T]) -> T:
+        """Returns the entry of `key`, calling `loader` to build it if it's missing or stale."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] < self.max_age:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        value = loader()
+        self.put(key, value)
+        return value
+
+    def peek(self, key: Hashable) -> Any | None:
+        """Returns the entry of `key` if it's there and fresh, None otherwise. Never loads it."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] < self.max_age:
+                return entry[1]
+        return None
+
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)